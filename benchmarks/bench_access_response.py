@@ -0,0 +1,107 @@
+"""
+Microbenchmark for building the /store/access response body.
+
+Compares the previous per-file path (request.url_for + FileMetadata +
+AccessResponse validation) with the fast path used by
+get_files_metadata_route (one URL resolution + slotted rows + orjson).
+Database and disk access are excluded; only per-file CPU cost is measured.
+
+    python -m benchmarks.bench_access_response [files ...]
+"""
+
+import sys
+import timeit
+
+import orjson
+from fastapi.encoders import jsonable_encoder
+from starlette.requests import Request
+
+from src.main import app
+from src.store.models import AccessResponse, FileMetadata, FileMetadataRow
+
+
+def _request() -> Request:
+    return Request(
+        {
+            "type": "http",
+            "app": app,
+            "router": app.router,
+            "scheme": "http",
+            "server": ("bench", 80),
+            "root_path": "",
+            "path": "/store/access",
+            "headers": [],
+            "query_string": b"",
+        }
+    )
+
+
+def _files_info(n: int):
+    return [
+        {
+            "original_filename": f"photo_{i}.jpg",
+            "stored_filename": f"{i:032x}_photo_{i}.jpg",
+            "file_type": "image/jpeg",
+            "file_size": 1024 * i,
+        }
+        for i in range(n)
+    ]
+
+
+def legacy(request: Request, files_info) -> bytes:
+    files = [
+        FileMetadata(
+            original_filename=fi["original_filename"],
+            file_type=fi["file_type"],
+            download_url=str(
+                request.url_for(
+                    "download_single_file", stored_filename=fi["stored_filename"]
+                )
+            ),
+            file_size=fi["file_size"],
+        )
+        for fi in files_info
+    ]
+    response = AccessResponse(otp="123456", files=files)
+    # what response_model=AccessResponse does before ORJSONResponse renders
+    validated = AccessResponse.model_validate(response.model_dump())
+    return orjson.dumps(jsonable_encoder(validated))
+
+
+def fast(request: Request, files_info) -> bytes:
+    prefix = str(request.url_for("download_single_file", stored_filename="_"))[:-1]
+    files = [
+        FileMetadataRow(
+            fi["original_filename"],
+            fi["file_type"],
+            prefix + fi["stored_filename"],
+            fi["file_size"],
+        )
+        for fi in files_info
+    ]
+    return orjson.dumps({"otp": "123456", "files": files})
+
+
+def main(sizes) -> None:
+    request = _request()
+    print(f"{'files':>6} {'legacy us/file':>15} {'fast us/file':>13} {'speedup':>8}")
+    for n in sizes:
+        files_info = _files_info(n)
+        assert orjson.loads(legacy(request, files_info)) == orjson.loads(
+            fast(request, files_info)
+        )
+        number = max(1, 20000 // n)
+        per_file = {}
+        for name, fn in (("legacy", legacy), ("fast", fast)):
+            best = min(
+                timeit.repeat(lambda: fn(request, files_info), number=number, repeat=5)
+            )
+            per_file[name] = best / number / n * 1e6
+        print(
+            f"{n:>6} {per_file['legacy']:>15.2f} {per_file['fast']:>13.2f}"
+            f" {per_file['legacy'] / per_file['fast']:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main([int(a) for a in sys.argv[1:]] or [1, 10, 100, 1000])
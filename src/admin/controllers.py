@@ -0,0 +1,73 @@
+from fastapi import APIRouter, BackgroundTasks, Depends, Query, status
+
+from src.admin.models import BoxListResponse, BulkDeleteRequest, DeleteResponse
+from src.admin.services import bulk_delete_boxes, delete_box_by_otp, list_boxes
+from src.configs.configs import Settings, get_settings
+from src.configs.db import SessionDep
+from src.replication.services import (
+    ROLE_PRIMARY,
+    latest_change_seq,
+    publish_changes,
+)
+from src.security.auth import APIKeyDep
+
+router = APIRouter(prefix="/admin", tags=["Admin routes"])
+
+
+def _schedule_after_delete(
+    background_tasks: BackgroundTasks, settings: Settings, after_seq: int
+) -> None:
+    if settings.REPLICATION_ROLE == ROLE_PRIMARY:
+        # pushes the deletions this request logged; followers also poll for them
+        background_tasks.add_task(publish_changes, after_seq)
+
+
+@router.get(
+    "/boxes",
+    response_model=BoxListResponse,
+    status_code=status.HTTP_200_OK,
+)
+async def list_boxes_route(
+    session: SessionDep,
+    api_key: APIKeyDep,
+    after_id: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+) -> BoxListResponse:
+    return await list_boxes(session=session, after_id=after_id, limit=limit)
+
+
+@router.delete(
+    "/boxes/{otp}",
+    response_model=DeleteResponse,
+    status_code=status.HTTP_200_OK,
+)
+async def delete_box_route(
+    session: SessionDep,
+    api_key: APIKeyDep,
+    otp: str,
+    background_tasks: BackgroundTasks,
+    settings: Settings = Depends(get_settings),
+) -> DeleteResponse:
+    after_seq = await latest_change_seq(session)
+    result = await delete_box_by_otp(session=session, otp=otp)
+    _schedule_after_delete(background_tasks, settings, after_seq)
+    return result
+
+
+@router.post(
+    "/boxes/bulk-delete",
+    response_model=DeleteResponse,
+    status_code=status.HTTP_200_OK,
+)
+async def bulk_delete_boxes_route(
+    session: SessionDep,
+    api_key: APIKeyDep,
+    criteria: BulkDeleteRequest,
+    background_tasks: BackgroundTasks,
+    settings: Settings = Depends(get_settings),
+) -> DeleteResponse:
+    after_seq = await latest_change_seq(session)
+    result = await bulk_delete_boxes(session=session, criteria=criteria)
+    if not criteria.dry_run and result.deleted_boxes:
+        _schedule_after_delete(background_tasks, settings, after_seq)
+    return result
@@ -0,0 +1,33 @@
+from datetime import datetime
+from typing import List, Optional
+
+from sqlmodel import SQLModel
+
+
+class BoxSummary(SQLModel):
+    id: int
+    otp: str
+    created_at: Optional[datetime] = None
+    file_count: int
+    total_size: int
+
+
+class BoxListResponse(SQLModel):
+    boxes: List[BoxSummary]
+    # pass as after_id to fetch the next page; None on the last page
+    next_cursor: Optional[int] = None
+    # store-wide totals, computed on the first page only (after_id=0)
+    total_boxes: Optional[int] = None
+    total_size: Optional[int] = None
+
+
+class BulkDeleteRequest(SQLModel):
+    created_before: Optional[datetime] = None
+    min_total_size: Optional[int] = None
+    dry_run: bool = False
+
+
+class DeleteResponse(SQLModel):
+    deleted_boxes: int
+    deleted_files: int
+    freed_bytes: int
@@ -0,0 +1,186 @@
+import asyncio
+import pathlib
+from datetime import timezone
+from typing import Any, Dict, List
+
+import aiofiles.os
+from fastapi import HTTPException, status
+from sqlalchemy import delete, func, literal_column
+from sqlmodel import select
+
+from src.admin.models import (
+    BoxListResponse,
+    BoxSummary,
+    BulkDeleteRequest,
+    DeleteResponse,
+)
+from src.configs.db import SessionDep
+from src.replication.models import BoxChange
+from src.store import services
+from src.store.models import Storagebox
+from src.store.previews import derivative_paths, get_preview_generator
+
+from ..utils.loger import LoggerSetup
+
+logger = LoggerSetup(logger_name=__name__, lazy=True).logger
+
+# rows deleted per transaction, so the database is never locked for long
+DELETE_BATCH_SIZE = 500
+# concurrent unlinks in flight; each one runs in aiofiles' executor
+UNLINK_CONCURRENCY = 16
+
+# recorded size of a box, summed by SQLite straight from the JSON column
+box_total_size = literal_column(
+    "(SELECT COALESCE(SUM(json_extract(value, '$.file_size')), 0) "
+    "FROM json_each(storagebox.file_details))"
+)
+box_file_count = func.coalesce(func.json_array_length(Storagebox.file_details), 0)
+
+
+async def list_boxes(
+    session: SessionDep, after_id: int = 0, limit: int = 100
+) -> BoxListResponse:
+    # keyset pagination: seek past the last id instead of OFFSET scans
+    statement = (
+        select(
+            Storagebox.id,
+            Storagebox.otp,
+            Storagebox.created_at,
+            box_file_count,
+            box_total_size,
+        )
+        .where(Storagebox.id > after_id)
+        .order_by(Storagebox.id)
+        .limit(limit + 1)
+    )
+    rows = (await session.exec(statement)).all()
+    next_cursor = rows[limit - 1][0] if len(rows) > limit else None
+
+    # the totals parse every box's JSON, so later pages don't repeat them
+    totals = (None, None)
+    if after_id == 0:
+        totals = (
+            await session.exec(
+                select(
+                    func.count(Storagebox.id),
+                    func.coalesce(func.sum(box_total_size), 0),
+                )
+            )
+        ).one()
+
+    return BoxListResponse(
+        boxes=[
+            BoxSummary(
+                id=box_id,
+                otp=otp,
+                created_at=created_at,
+                file_count=file_count,
+                total_size=total_size,
+            )
+            for box_id, otp, created_at, file_count, total_size in rows[:limit]
+        ],
+        next_cursor=next_cursor,
+        total_boxes=totals[0],
+        total_size=totals[1],
+    )
+
+
+async def unlink_stored_files(stored_filenames: List[str]) -> None:
+    semaphore = asyncio.Semaphore(UNLINK_CONCURRENCY)
+
+    async def unlink(path: pathlib.Path) -> None:
+        async with semaphore:
+            try:
+                await aiofiles.os.remove(str(path))
+            except FileNotFoundError:
+                pass
+            except OSError:
+                logger.exception(
+                    "Failed to remove stored file.", extra={"path": str(path)}
+                )
+
+    paths = []
+    generator = get_preview_generator()
+    for name in stored_filenames:
+        paths.append(services.UPLOAD_DIR / name)
+        # cached previews go with their original
+        paths.extend(derivative_paths(name))
+        generator.forget(name)
+    await asyncio.gather(*(unlink(path) for path in paths))
+
+
+async def _delete_boxes_where(
+    session: SessionDep, *criteria: Any, dry_run: bool = False
+) -> DeleteResponse:
+    """
+    Delete every box matching ``criteria`` in batches of DELETE_BATCH_SIZE.
+
+    Each batch is its own transaction; its files are unlinked concurrently once
+    the rows are gone, so a failed unlink can only leave an orphaned file and
+    never a record pointing at a missing one. Every deleted box is recorded in
+    the replication change log in the same transaction.
+    """
+    totals: Dict[str, int] = {"deleted_boxes": 0, "deleted_files": 0, "freed_bytes": 0}
+    cursor = 0
+    while True:
+        statement = (
+            select(Storagebox.id, Storagebox.otp, Storagebox.file_details)
+            .where(Storagebox.id > cursor, *criteria)
+            .order_by(Storagebox.id)
+            .limit(DELETE_BATCH_SIZE)
+        )
+        rows = (await session.exec(statement)).all()
+        if not rows:
+            break
+        cursor = rows[-1][0]
+
+        ids = [box_id for box_id, _, _ in rows]
+        stored_filenames = []
+        for _, _, file_details in rows:
+            for fd in file_details or []:
+                if fd.get("stored_filename"):
+                    stored_filenames.append(fd["stored_filename"])
+                    totals["freed_bytes"] += fd.get("file_size") or 0
+        totals["deleted_boxes"] += len(ids)
+        totals["deleted_files"] += len(stored_filenames)
+        if dry_run:
+            continue
+
+        await session.exec(delete(Storagebox).where(Storagebox.id.in_(ids)))
+        await services.remove_stored_file_index(session, ids)
+        session.add_all(
+            BoxChange(box_id=box_id, otp=otp, deleted=True) for box_id, otp, _ in rows
+        )
+        await session.commit()
+        await unlink_stored_files(stored_filenames)
+
+    if not dry_run:
+        logger.info("Boxes deleted.", extra=totals)
+    return DeleteResponse(**totals)
+
+
+async def delete_box_by_otp(session: SessionDep, otp: str) -> DeleteResponse:
+    record = await services.get_store_record_by_otp(session, otp)
+    return await _delete_boxes_where(session, Storagebox.id == record.id)
+
+
+async def bulk_delete_boxes(
+    session: SessionDep, criteria: BulkDeleteRequest
+) -> DeleteResponse:
+    conditions = []
+    if criteria.created_before is not None:
+        created_before = criteria.created_before
+        if created_before.tzinfo is not None:
+            # CURRENT_TIMESTAMP defaults are stored as naive UTC
+            created_before = created_before.astimezone(timezone.utc).replace(
+                tzinfo=None
+            )
+        conditions.append(Storagebox.created_at < created_before)
+    if criteria.min_total_size is not None:
+        conditions.append(box_total_size >= criteria.min_total_size)
+    if not conditions:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Provide created_before and/or min_total_size.",
+        )
+    return await _delete_boxes_where(session, *conditions, dry_run=criteria.dry_run)
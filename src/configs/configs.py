@@ -1,4 +1,5 @@
 from functools import lru_cache
+from typing import Optional
 
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
@@ -6,6 +7,23 @@ from pydantic_settings import BaseSettings, SettingsConfigDict
 class Settings(BaseSettings):
     DATABASE_URI: str
     API_KEY: str
+    # alembic revision the deployed schema is stamped with; when the database
+    # reports the same revision and has every table, startup skips create_all
+    SCHEMA_REVISION: Optional[str] = None
+    # background re-verification of stored files; 0 disables the scrubber.
+    # workers sharing an upload directory take turns through a file lock
+    SCRUB_RATE_BYTES_PER_SEC: int = 0
+    SCRUB_INTERVAL_SECONDS: int = 24 * 60 * 60
+    # render previews right after upload instead of on first request
+    PREVIEW_ON_UPLOAD: bool = False
+    # replication: "primary", "follower" or unset for a standalone node. nodes
+    # authenticate to each other with API_KEY
+    REPLICATION_ROLE: Optional[str] = None
+    # followers: where writes are forwarded to and changes are pulled from
+    REPLICATION_PRIMARY_URL: Optional[str] = None
+    # primary: comma separated base URLs new boxes are pushed to
+    REPLICATION_FOLLOWER_URLS: str = ""
+    REPLICATION_POLL_SECONDS: float = 5.0
     model_config = SettingsConfigDict(
         env_file=".env", env_file_encoding="utf-8", extra="ignore"
     )
@@ -1,34 +1,76 @@
-from typing import Annotated, AsyncGenerator
+import os
+from functools import lru_cache
+from typing import Annotated, AsyncGenerator, List, Optional
 
 from fastapi import Depends
-from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy import Connection, inspect
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
 from sqlmodel import SQLModel
 from sqlmodel.ext.asyncio.session import AsyncSession
 
 from ..utils.loger import LoggerSetup
 from .configs import get_settings
 
-logger_setup = LoggerSetup(logger_name=__name__)
+logger_setup = LoggerSetup(logger_name=__name__, lazy=True)
 logger = logger_setup.logger
 
-settings = get_settings()
 
-db_value = settings.DATABASE_URI
-if db_value.startswith("sqlite"):
-    sqlite_url = db_value
-else:
-    sqlite_url = f"sqlite+aiosqlite:///{db_value}"
+def get_database_url() -> str:
+    db_value = get_settings().DATABASE_URI
+    if db_value.startswith("sqlite"):
+        return db_value
+    return f"sqlite+aiosqlite:///{db_value}"
 
-engine = create_async_engine(sqlite_url, echo=False, future=True)
 
-async_session_maker = async_sessionmaker(
-    engine, class_=AsyncSession, expire_on_commit=False
-)
+# engine and session factory are built on first use instead of at import, so a
+# `gunicorn --preload` master never opens connections that workers would inherit
+@lru_cache()
+def get_engine() -> AsyncEngine:
+    return create_async_engine(get_database_url(), echo=False, future=True)
+
+
+@lru_cache()
+def get_session_maker() -> async_sessionmaker[AsyncSession]:
+    return async_sessionmaker(get_engine(), class_=AsyncSession, expire_on_commit=False)
+
+
+def _reset_engine_after_fork() -> None:
+    # pooled connections belong to the parent; drop them without closing
+    if get_engine.cache_info().currsize:
+        get_engine().sync_engine.dispose(close=False)
+
+
+os.register_at_fork(after_in_child=_reset_engine_after_fork)
+
+
+def _current_schema_revision(conn: Connection) -> Optional[str]:
+    # alembic is only needed when a revision check is configured
+    from alembic.runtime.migration import MigrationContext
+
+    return MigrationContext.configure(conn).get_current_revision()
+
+
+def _missing_tables(conn: Connection) -> List[str]:
+    existing = set(inspect(conn).get_table_names())
+    return [name for name in SQLModel.metadata.tables if name not in existing]
 
 
 async def create_db_and_tables() -> None:
+    expected_revision = get_settings().SCHEMA_REVISION
     try:
-        async with engine.begin() as conn:
+        async with get_engine().begin() as conn:
+            if expected_revision:
+                current = await conn.run_sync(_current_schema_revision)
+                # there are no migrations for new tables, so those still need
+                # create_all even when the stamped revision matches
+                if current == expected_revision and not await conn.run_sync(
+                    _missing_tables
+                ):
+                    logger.info(
+                        "Schema revision matches, skipping table creation.",
+                        extra={"revision": current},
+                    )
+                    return
             await conn.run_sync(SQLModel.metadata.create_all)
         logger.info("Database tables created successfully.")
     except Exception:
@@ -36,8 +78,13 @@ async def create_db_and_tables() -> None:
         raise
 
 
+async def dispose_engine() -> None:
+    if get_engine.cache_info().currsize:
+        await get_engine().dispose()
+
+
 async def get_session() -> AsyncGenerator[AsyncSession, None]:
-    async with async_session_maker() as session:
+    async with get_session_maker()() as session:
         yield session
 
 
@@ -1,3 +1,4 @@
+import asyncio
 import logging
 from contextlib import asynccontextmanager
 
@@ -6,22 +7,60 @@ from fastapi import FastAPI, status
 from fastapi.responses import ORJSONResponse
 from prometheus_client import make_asgi_app
 
-from src.configs.db import create_db_and_tables
+from src.admin.controllers import router as admin_router
+from src.configs.configs import get_settings
+from src.configs.db import create_db_and_tables, dispose_engine, get_session_maker
+from src.replication.controllers import router as replication_router
+from src.replication.services import (
+    ROLE_FOLLOWER,
+    FollowerSync,
+    FollowerWriteForwarder,
+    backfill_change_log,
+    close_http_client,
+)
 from src.store.controllers import router
+from src.store.previews import shutdown_preview_generator
+from src.store.scrubber import IntegrityScrubber
+from src.store.services import (
+    backfill_stored_file_index,
+    ensure_upload_dir,
+    shutdown_threadpool,
+)
 
-from .utils.loger import LoggerSetup
+from .utils.loger import LoggerSetup, stop_listener
+from .utils.startup import StartupTimer
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    app.state.logger_setup_instance = LoggerSetup(logger_name=__name__)
-    app.state.logger = logging.getLogger(__name__)
-    logging.getLogger("uvicorn.access").propagate = False
+    # everything below runs once per worker, after any `gunicorn --preload` fork
+    timer = StartupTimer()
+    with timer.step("logging"):
+        app.state.logger_setup_instance = LoggerSetup(logger_name=__name__)
+        app.state.logger = logging.getLogger(__name__)
+        logging.getLogger("uvicorn.access").propagate = False
 
     app.state.logger.info("App starting")
+    settings = get_settings()
+    with timer.step("upload_dir"):
+        ensure_upload_dir()
     app.state.logger.info("Initializing database and tables.")
     try:
-        await create_db_and_tables()
+        with timer.step("database"):
+            await create_db_and_tables()
+        with timer.step("stored_file_index"):
+            async with get_session_maker()() as session:
+                indexed = await backfill_stored_file_index(session)
+        if indexed:
+            app.state.logger.info(
+                "Stored file index backfilled.", extra={"files": indexed}
+            )
+        if settings.REPLICATION_ROLE != ROLE_FOLLOWER:
+            with timer.step("change_log"):
+                async with get_session_maker()() as session:
+                    logged = await backfill_change_log(session)
+            if logged:
+                app.state.logger.info("Change log backfilled.", extra={"boxes": logged})
         app.state.logger.info("Database initialized.")
     except Exception:
         app.state.logger.error(
@@ -29,21 +68,44 @@ async def lifespan(app: FastAPI):
             exc_info=True,
         )
         raise
+    app.state.scrubber = None
+    if settings.SCRUB_RATE_BYTES_PER_SEC > 0:
+        app.state.scrubber = IntegrityScrubber(
+            rate_bytes_per_sec=settings.SCRUB_RATE_BYTES_PER_SEC,
+            interval_seconds=settings.SCRUB_INTERVAL_SECONDS,
+        )
+        app.state.scrubber.start()
+    app.state.follower_sync = None
+    if settings.REPLICATION_ROLE == ROLE_FOLLOWER:
+        app.state.follower_sync = FollowerSync(settings)
+        app.state.follower_sync.start()
+    app.state.startup_timings = timer.report()
+    app.state.logger.info(
+        "Startup complete.", extra={"startup_ms": app.state.startup_timings}
+    )
     yield
     app.state.logger.info("App shutting down. Waiting for logs to be processed...")
-    logger_setup = getattr(app.state, "logger_setup_instance", None)
-    if logger_setup is not None:
-        listener = getattr(logger_setup, "listener", None)
-        if listener is not None:
-            try:
-                listener.stop()
-            except Exception:
-                app.state.logger.exception("Failed to stop logger listener cleanly.")
+    if app.state.scrubber is not None:
+        await app.state.scrubber.stop()
+    if app.state.follower_sync is not None:
+        await app.state.follower_sync.stop()
+    await close_http_client()
+    # waits for running file operations; keep the event loop responsive
+    await asyncio.to_thread(shutdown_threadpool)
+    shutdown_preview_generator()
+    await dispose_engine()
     app.state.logger.info("App stopped")
+    try:
+        stop_listener()
+    except Exception:
+        app.state.logger.exception("Failed to stop logger listener cleanly.")
 
 
 app = FastAPI(lifespan=lifespan)
 app.include_router(router=router)
+app.include_router(router=admin_router)
+app.include_router(router=replication_router)
+app.add_middleware(FollowerWriteForwarder)
 metrics_app = make_asgi_app()
 app.mount("/metrics", metrics_app)
 
@@ -0,0 +1,87 @@
+import pathlib
+from typing import List
+
+from fastapi import (
+    APIRouter,
+    Depends,
+    HTTPException,
+    Path,
+    Query,
+    Request,
+    Response,
+    status,
+)
+from fastapi.responses import ORJSONResponse
+
+from src.configs.configs import Settings, get_settings
+from src.configs.db import SessionDep
+from src.replication.models import ChangesResponse, ReplicatedChange
+from src.replication.services import (
+    ROLE_FOLLOWER,
+    apply_changes,
+    list_changes,
+    store_blob,
+)
+from src.security.auth import APIKeyDep
+from src.store.integrity import expected_digests
+
+router = APIRouter(prefix="/replication", tags=["Replication routes"])
+
+
+def _require_follower(settings: Settings) -> None:
+    if settings.REPLICATION_ROLE != ROLE_FOLLOWER:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="This node does not accept replicated data.",
+        )
+
+
+@router.get(
+    "/changes",
+    response_model=ChangesResponse,
+    status_code=status.HTTP_200_OK,
+)
+async def list_changes_route(
+    session: SessionDep,
+    api_key: APIKeyDep,
+    after_seq: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+) -> ChangesResponse:
+    return await list_changes(session=session, after_seq=after_seq, limit=limit)
+
+
+@router.put(
+    "/blobs/{stored_filename}",
+    status_code=status.HTTP_204_NO_CONTENT,
+)
+async def receive_blob_route(
+    request: Request,
+    api_key: APIKeyDep,
+    stored_filename: str = Path(...),
+    settings: Settings = Depends(get_settings),
+) -> Response:
+    _require_follower(settings)
+    if pathlib.Path(stored_filename).name != stored_filename:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid filename."
+        )
+    await store_blob(
+        stored_filename, request.stream(), expected_digests(request.headers)
+    )
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+
+@router.post(
+    "/changes",
+    response_class=ORJSONResponse,
+    status_code=status.HTTP_200_OK,
+)
+async def receive_changes_route(
+    session: SessionDep,
+    api_key: APIKeyDep,
+    changes: List[ReplicatedChange],
+    settings: Settings = Depends(get_settings),
+):
+    _require_follower(settings)
+    applied = await apply_changes(session=session, changes=changes, settings=settings)
+    return ORJSONResponse({"applied": applied})
@@ -0,0 +1,57 @@
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from sqlmodel import TIMESTAMP, Column, Field, SQLModel, text
+
+
+class BoxChange(SQLModel, table=True):
+    """
+    Replication change log: one row per box created or deleted. ``seq`` uses
+    AUTOINCREMENT so it only ever grows; Storagebox.id can't serve as the log
+    because SQLite hands a deleted highest id to the next insert. Followers
+    keep the rows they applied under the primary's ``seq``.
+    """
+
+    __table_args__ = {"sqlite_autoincrement": True}
+
+    seq: int = Field(default=None, primary_key=True)
+    box_id: int = Field(nullable=False, index=True)
+    otp: str = Field(nullable=False, max_length=6)
+    deleted: bool = Field(default=False, nullable=False)
+    created_at: Optional[datetime] = Field(
+        default=None,
+        sa_column=Column(
+            TIMESTAMP(timezone=True),
+            nullable=False,
+            server_default=text("CURRENT_TIMESTAMP"),
+        ),
+    )
+
+
+class ReplicationCursor(SQLModel, table=True):
+    """How far a follower has read the change log of a primary."""
+
+    primary_url: str = Field(primary_key=True)
+    last_seq: int = Field(default=0, nullable=False)
+
+
+class ReplicatedBox(SQLModel):
+    id: int
+    otp: str
+    file_details: List[Dict[str, Any]]
+    created_at: Optional[datetime] = None
+
+
+class ReplicatedChange(SQLModel):
+    seq: int
+    box_id: int
+    otp: str
+    deleted: bool = False
+    # set on creations whose box still exists on the primary
+    box: Optional[ReplicatedBox] = None
+
+
+class ChangesResponse(SQLModel):
+    changes: List[ReplicatedChange]
+    # highest seq in this page; pass back as after_seq, None when caught up
+    last_seq: Optional[int] = None
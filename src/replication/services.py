@@ -0,0 +1,564 @@
+import asyncio
+import os
+import uuid
+from typing import Any, AsyncIterator, Dict, List, Optional
+from urllib.parse import quote
+
+import aiofiles
+import aiofiles.os
+import httpx
+from fastapi import HTTPException, Request, status
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from sqlalchemy import and_, delete, func, or_, text
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import select
+from starlette.background import BackgroundTask
+
+from src.admin.services import unlink_stored_files
+from src.configs.configs import Settings, get_settings
+from src.configs.db import SessionDep, get_session_maker
+from src.replication.models import (
+    BoxChange,
+    ChangesResponse,
+    ReplicatedBox,
+    ReplicatedChange,
+    ReplicationCursor,
+)
+from src.security.auth import API_KEY_HEADER_NAME
+from src.store import services
+from src.store.integrity import (
+    DIGEST_FIELDS,
+    FileDigester,
+    format_repr_digest,
+    verify_digests,
+)
+from src.store.models import Storagebox
+
+from ..utils.locks import try_lock_file
+from ..utils.loger import LoggerSetup
+
+logger = LoggerSetup(logger_name=__name__, lazy=True).logger
+
+ROLE_PRIMARY = "primary"
+ROLE_FOLLOWER = "follower"
+CHANGES_BATCH_SIZE = 100
+SYNC_LOCK_NAME = ".replication.lock"
+# headers describing a single connection; never proxied to the primary
+HOP_BY_HOP_HEADERS = {
+    "connection",
+    "host",
+    "keep-alive",
+    "proxy-authenticate",
+    "proxy-authorization",
+    "te",
+    "trailer",
+    "transfer-encoding",
+    "upgrade",
+}
+
+_http_client: Optional[httpx.AsyncClient] = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    global _http_client
+    if _http_client is None:
+        _http_client = httpx.AsyncClient(timeout=httpx.Timeout(60.0, connect=5.0))
+    return _http_client
+
+
+async def close_http_client() -> None:
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+
+def _node_headers(settings: Settings) -> Dict[str, str]:
+    return {API_KEY_HEADER_NAME: settings.API_KEY}
+
+
+def _primary_url(settings: Settings) -> str:
+    if not settings.REPLICATION_PRIMARY_URL:
+        raise RuntimeError("REPLICATION_PRIMARY_URL is required on followers.")
+    return settings.REPLICATION_PRIMARY_URL.rstrip("/")
+
+
+def follower_urls(settings: Settings) -> List[str]:
+    return [
+        url.strip().rstrip("/")
+        for url in settings.REPLICATION_FOLLOWER_URLS.split(",")
+        if url.strip()
+    ]
+
+
+def _stored_filenames(file_details: Optional[List[Dict[str, Any]]]) -> List[str]:
+    return [
+        fd["stored_filename"] for fd in file_details or [] if fd.get("stored_filename")
+    ]
+
+
+def _detail_digests(file_detail: Dict[str, Any]) -> Dict[str, bytes]:
+    return {
+        alg: bytes.fromhex(file_detail[field])
+        for alg, field in DIGEST_FIELDS.items()
+        if file_detail.get(field)
+    }
+
+
+# primary side
+
+
+def _box_payload(record: Storagebox) -> ReplicatedBox:
+    return ReplicatedBox(
+        id=record.id,
+        otp=record.otp,
+        file_details=record.file_details,
+        created_at=record.created_at,
+    )
+
+
+async def list_changes(
+    session: SessionDep, after_seq: int = 0, limit: int = CHANGES_BATCH_SIZE
+) -> ChangesResponse:
+    """
+    Change log entries after ``after_seq``. Creations carry their box unless it
+    has been deleted since; its deletion follows later in the log.
+    """
+    statement = (
+        select(BoxChange, Storagebox)
+        .outerjoin(
+            Storagebox,
+            and_(
+                Storagebox.id == BoxChange.box_id,
+                Storagebox.otp == BoxChange.otp,
+                BoxChange.deleted == False,  # noqa: E712
+            ),
+        )
+        .where(BoxChange.seq > after_seq)
+        .order_by(BoxChange.seq)
+        .limit(limit)
+    )
+    rows = (await session.exec(statement)).all()
+    return ChangesResponse(
+        changes=[
+            ReplicatedChange(
+                seq=change.seq,
+                box_id=change.box_id,
+                otp=change.otp,
+                deleted=change.deleted,
+                box=_box_payload(record) if record is not None else None,
+            )
+            for change, record in rows
+        ],
+        last_seq=rows[-1][0].seq if rows else None,
+    )
+
+
+async def latest_change_seq(session: SessionDep) -> int:
+    return (await session.exec(select(func.max(BoxChange.seq)))).one() or 0
+
+
+async def backfill_change_log(session: SessionDep) -> int:
+    """
+    Log a creation for every existing box when the change log is empty but
+    boxes exist, i.e. on the first start after the log was added. Followers
+    keep the primary's log instead, so they never call this.
+    """
+    # one statement, so workers starting together can't both insert
+    result = await session.execute(
+        text(
+            "INSERT INTO boxchange (box_id, otp, deleted) "
+            "SELECT id, otp, 0 FROM storagebox "
+            "WHERE NOT EXISTS (SELECT 1 FROM boxchange) ORDER BY id"
+        )
+    )
+    await session.commit()
+    return result.rowcount
+
+
+async def _push_blobs(follower_url: str, box: ReplicatedBox, settings: Settings):
+    client = get_http_client()
+    headers = _node_headers(settings)
+    for fd in box.file_details:
+        stored_filename = fd.get("stored_filename")
+        if not stored_filename:
+            continue
+        blob_headers = dict(headers)
+        repr_digest = format_repr_digest(fd)
+        if repr_digest:
+            blob_headers["Repr-Digest"] = repr_digest
+        response = await client.put(
+            f"{follower_url}/replication/blobs/{quote(stored_filename)}",
+            content=services.get_files(str(services.UPLOAD_DIR / stored_filename)),
+            headers=blob_headers,
+        )
+        response.raise_for_status()
+
+
+async def _push_changes(
+    follower_url: str, changes: List[ReplicatedChange], settings: Settings
+):
+    try:
+        for change in changes:
+            if change.box is not None:
+                await _push_blobs(follower_url, change.box, settings)
+        response = await get_http_client().post(
+            f"{follower_url}/replication/changes",
+            json=[change.model_dump(mode="json") for change in changes],
+            headers=_node_headers(settings),
+        )
+        response.raise_for_status()
+    except (httpx.HTTPError, OSError):
+        # not fatal: the follower picks the changes up when it polls
+        logger.warning(
+            "Failed to push changes to follower.",
+            extra={"follower": follower_url, "seq": changes[0].seq},
+            exc_info=True,
+        )
+
+
+async def _publish(after_seq: int, limit: int) -> Optional[int]:
+    settings = get_settings()
+    urls = follower_urls(settings)
+    if not urls:
+        return None
+    async with get_session_maker()() as session:
+        changes = (await list_changes(session, after_seq, limit)).changes
+    if not changes:
+        return None
+    await asyncio.gather(*(_push_changes(url, changes, settings) for url in urls))
+    return changes[-1].seq
+
+
+async def publish_changes(after_seq: int) -> None:
+    """Push every change logged after ``after_seq`` to the followers."""
+    while after_seq is not None:
+        after_seq = await _publish(after_seq, CHANGES_BATCH_SIZE)
+
+
+async def publish_box(box_id: int) -> None:
+    """Push a new box (metadata and blobs) to every follower, concurrently."""
+    async with get_session_maker()() as session:
+        statement = (
+            select(func.max(BoxChange.seq))
+            .where(BoxChange.box_id == box_id)
+            .where(BoxChange.deleted == False)  # noqa: E712
+        )
+        seq = (await session.exec(statement)).one()
+    if seq is not None:
+        await _publish(seq - 1, 1)
+
+
+# follower side
+
+
+async def store_blob(
+    stored_filename: str,
+    chunks: AsyncIterator[bytes],
+    expected: Dict[str, bytes],
+) -> None:
+    """
+    Write a replicated file into UPLOAD_DIR. The data goes to a temporary name
+    first and is only renamed into place once its digests have been verified.
+    """
+    upload_dir = services.ensure_upload_dir()
+    tmp_path = upload_dir / f".{uuid.uuid4().hex}.part"
+    digester = FileDigester()
+    written = 0
+    try:
+        async with aiofiles.open(tmp_path, "wb") as f:
+            async for chunk in chunks:
+                written += len(chunk)
+                if written > services.MAX_FILE_SIZE_BYTES:
+                    raise HTTPException(
+                        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                        detail=f"File {stored_filename} exceeds allowed size.",
+                    )
+                digester.update(chunk)
+                await f.write(chunk)
+        verify_digests(expected, digester.digests(), stored_filename)
+        await aiofiles.os.replace(str(tmp_path), str(upload_dir / stored_filename))
+    except BaseException:
+        try:
+            await aiofiles.os.remove(str(tmp_path))
+        except FileNotFoundError:
+            pass
+        raise
+
+
+async def _pull_blob(
+    stored_filename: str, file_detail: Dict[str, Any], settings: Settings
+) -> None:
+    url = f"{_primary_url(settings)}/store/download/{quote(stored_filename)}"
+    async with get_http_client().stream("GET", url) as response:
+        response.raise_for_status()
+        await store_blob(
+            stored_filename, response.aiter_bytes(), _detail_digests(file_detail)
+        )
+
+
+async def _already_applied(session: SessionDep, seq: int) -> bool:
+    return await session.get(BoxChange, seq) is not None
+
+
+async def _commit_change(session: SessionDep, change: ReplicatedChange) -> bool:
+    """
+    Record ``change`` and commit together with whatever the caller staged.
+    False if another worker (a push racing the poller) applied it first.
+    """
+    session.add(
+        BoxChange(
+            seq=change.seq,
+            box_id=change.box_id,
+            otp=change.otp,
+            deleted=change.deleted,
+        )
+    )
+    try:
+        await session.commit()
+    except IntegrityError:
+        await session.rollback()
+        if await _already_applied(session, change.seq):
+            return False
+        logger.error(
+            "Failed to apply replicated change.",
+            extra={"seq": change.seq, "box_id": change.box_id},
+            exc_info=True,
+        )
+        raise
+    return True
+
+
+async def _apply_deletion(session: SessionDep, change: ReplicatedChange) -> bool:
+    # only when id and otp both match: the primary may have reused either
+    statement = select(Storagebox.file_details).where(
+        Storagebox.id == change.box_id, Storagebox.otp == change.otp
+    )
+    file_details = (await session.exec(statement)).first()
+    if file_details is not None:
+        await session.exec(delete(Storagebox).where(Storagebox.id == change.box_id))
+        await services.remove_stored_file_index(session, [change.box_id])
+    if not await _commit_change(session, change):
+        return False
+    if file_details is not None:
+        await unlink_stored_files(_stored_filenames(file_details))
+    return True
+
+
+async def _apply_creation(
+    session: SessionDep, change: ReplicatedChange, settings: Settings
+) -> bool:
+    box = change.box
+    # a later change to the same id or otp means this box was deleted since,
+    # even if that deletion hasn't reached this node yet
+    statement = select(BoxChange.seq).where(
+        BoxChange.seq > change.seq,
+        or_(BoxChange.box_id == change.box_id, BoxChange.otp == change.otp),
+    )
+    if box is None or (await session.exec(statement)).first() is not None:
+        return await _commit_change(session, change)
+
+    for fd in box.file_details:
+        stored_filename = fd.get("stored_filename")
+        if stored_filename and not await aiofiles.os.path.exists(
+            str(services.UPLOAD_DIR / stored_filename)
+        ):
+            await _pull_blob(stored_filename, fd, settings)
+
+    # ids and OTPs are unique on the primary, so a local box holding either
+    # one was deleted there and the value reused
+    statement = select(Storagebox.id, Storagebox.file_details).where(
+        or_(Storagebox.id == box.id, Storagebox.otp == box.otp)
+    )
+    stale = dict((await session.exec(statement)).all())
+    if stale:
+        await session.exec(delete(Storagebox).where(Storagebox.id.in_(stale)))
+        await services.remove_stored_file_index(session, list(stale))
+    session.add(
+        Storagebox(
+            id=box.id,
+            otp=box.otp,
+            file_details=box.file_details,
+            created_at=box.created_at,
+        )
+    )
+    services.add_stored_file_index(session, box.id, box.file_details)
+    if not await _commit_change(session, change):
+        return False
+    if stale:
+        logger.info(
+            "Replaced stale boxes.", extra={"box_id": box.id, "stale": list(stale)}
+        )
+        keep = set(_stored_filenames(box.file_details))
+        await unlink_stored_files(
+            [
+                name
+                for file_details in stale.values()
+                for name in _stored_filenames(file_details)
+                if name not in keep
+            ]
+        )
+    return True
+
+
+async def apply_changes(
+    session: SessionDep, changes: List[ReplicatedChange], settings: Settings
+) -> int:
+    """
+    Replay the primary's change log, in ``seq`` order, each change in its own
+    transaction that also records it locally; changes already recorded are
+    skipped, so pushes and polls may overlap. Files that were not pushed
+    beforehand are pulled from the primary, and a box is only inserted once
+    all of them are on disk. Failures are raised, never skipped, so callers
+    don't move past a change that isn't applied. Returns the number applied.
+    """
+    applied = 0
+    for change in sorted(changes, key=lambda c: c.seq):
+        if await _already_applied(session, change.seq):
+            continue
+        if change.deleted:
+            done = await _apply_deletion(session, change)
+        else:
+            done = await _apply_creation(session, change, settings)
+        applied += done
+    return applied
+
+
+class FollowerSync:
+    """
+    Keeps a follower in sync by polling the primary's change log. Pushes from
+    the primary are the fast path; this loop fills in whatever a push missed,
+    e.g. while the follower was down.
+
+    Each worker starts one, but a flock on a file in UPLOAD_DIR lets only one
+    process per follower poll. The position in the log is stored in
+    ReplicationCursor, so a restart resumes where the last poller stopped.
+    """
+
+    def __init__(self, settings: Settings):
+        self.settings = settings
+        self._task: Optional[asyncio.Task] = None
+
+    async def catch_up(self) -> int:
+        applied = 0
+        client = get_http_client()
+        primary_url = _primary_url(self.settings)
+        async with get_session_maker()() as session:
+            cursor = await session.get(ReplicationCursor, primary_url)
+            last_seq = cursor.last_seq if cursor is not None else 0
+            while True:
+                response = await client.get(
+                    f"{primary_url}/replication/changes",
+                    params={"after_seq": last_seq, "limit": CHANGES_BATCH_SIZE},
+                    headers=_node_headers(self.settings),
+                )
+                response.raise_for_status()
+                changes = ChangesResponse.model_validate(response.json())
+                if not changes.changes:
+                    return applied
+                # a failure raises before the cursor moves, so the page is retried
+                applied += await apply_changes(session, changes.changes, self.settings)
+                last_seq = changes.last_seq
+                await session.merge(
+                    ReplicationCursor(primary_url=primary_url, last_seq=last_seq)
+                )
+                await session.commit()
+
+    async def run_forever(self) -> None:
+        lock_path = services.ensure_upload_dir() / SYNC_LOCK_NAME
+        while (lock_fd := try_lock_file(lock_path)) is None:
+            await asyncio.sleep(self.settings.REPLICATION_POLL_SECONDS)
+        try:
+            while True:
+                try:
+                    applied = await self.catch_up()
+                    if applied:
+                        logger.info(
+                            "Caught up with primary.", extra={"applied": applied}
+                        )
+                except asyncio.CancelledError:
+                    raise
+                except Exception:
+                    logger.warning("Replication catch-up failed.", exc_info=True)
+                await asyncio.sleep(self.settings.REPLICATION_POLL_SECONDS)
+        finally:
+            # closing the fd releases the lock for the other workers
+            os.close(lock_fd)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self.run_forever())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+def is_forwarded_write(method: str, path: str) -> bool:
+    """Requests a follower must not handle itself: uploads and admin writes."""
+    if method == "POST" and path.rstrip("/") in ("/store", "/store/stream"):
+        return True
+    return path.startswith("/admin") and method not in ("GET", "HEAD", "OPTIONS")
+
+
+async def forward_to_primary(request: Request, settings: Settings):
+    """Proxy a request to the primary, streaming both bodies through."""
+    url = f"{_primary_url(settings)}{request.url.path}"
+    if request.url.query:
+        url = f"{url}?{request.url.query}"
+    headers = [
+        (k, v)
+        for k, v in request.headers.raw
+        if k.decode("latin-1").lower() not in HOP_BY_HOP_HEADERS
+    ]
+    client = get_http_client()
+    try:
+        upstream = await client.send(
+            client.build_request(
+                request.method, url, headers=headers, content=request.stream()
+            ),
+            stream=True,
+        )
+    except httpx.HTTPError:
+        logger.warning(
+            "Failed to forward request to primary.",
+            extra={"method": request.method, "path": request.url.path},
+            exc_info=True,
+        )
+        return ORJSONResponse(
+            {"detail": "Primary node is unavailable."},
+            status_code=status.HTTP_502_BAD_GATEWAY,
+        )
+    return StreamingResponse(
+        upstream.aiter_raw(),
+        status_code=upstream.status_code,
+        headers={
+            k: v
+            for k, v in upstream.headers.items()
+            if k.lower() not in HOP_BY_HOP_HEADERS
+        },
+        background=BackgroundTask(upstream.aclose),
+    )
+
+
+class FollowerWriteForwarder:
+    """ASGI middleware sending writes that reach a follower to the primary."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and is_forwarded_write(
+            scope["method"], scope["path"]
+        ):
+            settings = get_settings()
+            if settings.REPLICATION_ROLE == ROLE_FOLLOWER:
+                response = await forward_to_primary(Request(scope, receive), settings)
+                await response(scope, receive, send)
+                return
+        await self.app(scope, receive, send)
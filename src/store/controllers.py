@@ -1,9 +1,11 @@
 import mimetypes
 import pathlib
-from typing import List
+from typing import Any, Dict, List
 
 from fastapi import (
     APIRouter,
+    BackgroundTasks,
+    Depends,
     File,
     HTTPException,
     Path,
@@ -14,24 +16,39 @@ from fastapi import (
 )
 from fastapi.responses import ORJSONResponse, StreamingResponse
 
+from src.configs.configs import Settings, get_settings
 from src.configs.db import SessionDep
+from src.replication.services import ROLE_PRIMARY, publish_box
+from src.store.integrity import format_repr_digest
 from src.store.models import (
     AccessResponse,
-    FileMetadata,
     OtpRequest,
     OtpRequestResponse,
 )
+from src.store.previews import generate_previews, get_preview_generator
 from src.store.services import (
     UPLOAD_DIR,
     add_file,
+    add_file_stream,
     generate_file_zip,
+    get_file_detail_by_stored_filename,
     get_file_info_for_otp,
+    get_file_metadata_for_otp,
     get_files,
 )
 
 router = APIRouter(prefix="/store", tags=["Storagebox routes"])
 
 
+def _schedule_after_upload(
+    background_tasks: BackgroundTasks, settings: Settings, data: Dict[str, Any]
+) -> None:
+    if settings.PREVIEW_ON_UPLOAD:
+        background_tasks.add_task(generate_previews, data["stored_files"])
+    if settings.REPLICATION_ROLE == ROLE_PRIMARY:
+        background_tasks.add_task(publish_box, data["id"])
+
+
 @router.post(
     "",
     status_code=status.HTTP_201_CREATED,
@@ -40,9 +57,29 @@ router = APIRouter(prefix="/store", tags=["Storagebox routes"])
 )
 async def add_files_route(
     session: SessionDep,
+    background_tasks: BackgroundTasks,
     files: List[UploadFile] = File(...),
+    settings: Settings = Depends(get_settings),
 ):
     data = await add_file(session=session, files=files)
+    _schedule_after_upload(background_tasks, settings, data)
+    return OtpRequestResponse(message=data["message"], otp=data["otp"])
+
+
+@router.post(
+    "/stream",
+    status_code=status.HTTP_201_CREATED,
+    response_class=ORJSONResponse,
+)
+async def add_files_stream_route(
+    session: SessionDep,
+    request: Request,
+    background_tasks: BackgroundTasks,
+    settings: Settings = Depends(get_settings),
+):
+    # reads the raw body instead of File(...) so nothing is spooled to a temp file
+    data = await add_file_stream(session=session, request=request)
+    _schedule_after_upload(background_tasks, settings, data)
     return OtpRequestResponse(message=data["message"], otp=data["otp"])
 
 
@@ -56,25 +93,18 @@ async def get_files_metadata_route(
     session: SessionDep,
     request: Request,
     otp_request: OtpRequest,
-) -> AccessResponse:
-    files_info = await get_file_info_for_otp(session=session, otp=otp_request.otp)
-    response_files_metadata = []
-    for file_info in files_info:
-        # build a safe download URL using request.url_for (requires route name)
-        download_url = str(
-            request.url_for(
-                "download_single_file", stored_filename=file_info["stored_filename"]
-            )
-        )
-        response_files_metadata.append(
-            FileMetadata(
-                original_filename=file_info["original_filename"],
-                file_type=file_info["file_type"],
-                download_url=download_url,
-                file_size=file_info["file_size"],
-            )
-        )
-    return AccessResponse(otp=otp_request.otp, files=response_files_metadata)
+) -> ORJSONResponse:
+    # resolve the download route once and append each stored_filename to it,
+    # instead of calling request.url_for per file
+    download_url_prefix = str(
+        request.url_for("download_single_file", stored_filename="_")
+    )[:-1]
+    files = await get_file_metadata_for_otp(
+        session=session, otp=otp_request.otp, download_url_prefix=download_url_prefix
+    )
+    # returning the response directly skips re-validation through response_model,
+    # which is kept for the OpenAPI schema only
+    return ORJSONResponse({"otp": otp_request.otp, "files": files})
 
 
 @router.get(
@@ -94,7 +124,7 @@ async def download_single_file_route(
         )
 
     file_path = UPLOAD_DIR / stored_filename
-    if not file_path.exists():
+    if not file_path.is_file():
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="File not found on server."
         )
@@ -109,22 +139,15 @@ async def download_single_file_route(
     if content_type is None:
         content_type = "application/octet-stream"
 
-    # Use original filename if present in DB to present sensible filename to client
-    # We can optionally look it up; quick attempt:
+    # Use original filename and stored digests from the DB when available
     try:
-        files_info = await get_file_info_for_otp(
-            session=session, otp=stored_filename[:6]
+        file_detail = await get_file_detail_by_stored_filename(
+            session=session, stored_filename=stored_filename
         )
-        # try to find matching stored_filename entry
-        original_name = None
-        for fi in files_info:
-            if fi["stored_filename"] == stored_filename:
-                original_name = fi["original_filename"]
-                break
-    except Exception:
-        original_name = None
+    except HTTPException:
+        file_detail = {}
 
-    download_name = original_name or stored_filename
+    download_name = file_detail.get("original_filename") or stored_filename
 
     headers = {
         "ETag": etag,
@@ -132,6 +155,9 @@ async def download_single_file_route(
         # using attachment and sanitized filename
         "Content-Disposition": f'attachment; filename="{pathlib.Path(download_name).name}"',
     }
+    repr_digest = format_repr_digest(file_detail)
+    if repr_digest:
+        headers["Repr-Digest"] = repr_digest
 
     return StreamingResponse(
         content=get_files(str(file_path)),
@@ -140,6 +166,59 @@ async def download_single_file_route(
     )
 
 
+@router.get(
+    "/preview/{stored_filename}",
+    name="preview_file",
+    status_code=status.HTTP_200_OK,
+)
+async def preview_file_route(
+    session: SessionDep,
+    request: Request,
+    stored_filename: str = Path(...),
+) -> Response:
+    if pathlib.Path(stored_filename).name != stored_filename:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid filename."
+        )
+
+    file_detail = await get_file_detail_by_stored_filename(
+        session=session, stored_filename=stored_filename
+    )
+    if not (UPLOAD_DIR / stored_filename).is_file():
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="File not found on server."
+        )
+
+    # previews derive from immutable originals, so they are cacheable just the same
+    etag = f'"preview-{stored_filename}"'
+    if request.headers.get("if-none-match") == etag:
+        return Response(
+            status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag}
+        )
+
+    file_type = file_detail.get("file_type")
+    if not file_type or file_type == "application/octet-stream":
+        file_type, _ = mimetypes.guess_type(
+            file_detail.get("original_filename") or stored_filename
+        )
+    preview = await get_preview_generator().get(stored_filename, file_type)
+    if preview is None:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail="No preview available for this file type.",
+        )
+
+    content, media_type = preview
+    return Response(
+        content=content,
+        media_type=media_type,
+        headers={
+            "ETag": etag,
+            "Cache-Control": "public, max-age=86400, immutable",
+        },
+    )
+
+
 @router.post(
     "/access/zip",
     response_class=StreamingResponse,
@@ -0,0 +1,87 @@
+import base64
+import binascii
+import hashlib
+import hmac
+from typing import Any, Dict, Mapping, Optional
+
+import google_crc32c
+from fastapi import HTTPException, status
+
+# RFC 9530 algorithm keys mapped to the file_details fields they are stored in
+DIGEST_FIELDS = {"sha-256": "sha256", "crc32c": "crc32c"}
+
+
+class FileDigester:
+    """Incrementally computes every supported digest of a byte stream."""
+
+    __slots__ = ("_sha256", "_crc32c")
+
+    def __init__(self):
+        self._sha256 = hashlib.sha256()
+        self._crc32c = google_crc32c.Checksum()
+
+    def update(self, data: bytes) -> None:
+        self._sha256.update(data)
+        self._crc32c.update(data)
+
+    def digests(self) -> Dict[str, bytes]:
+        return {"sha-256": self._sha256.digest(), "crc32c": self._crc32c.digest()}
+
+    def details(self) -> Dict[str, str]:
+        """Hex digests keyed the way they are stored in file_details."""
+        return {DIGEST_FIELDS[alg]: d.hex() for alg, d in self.digests().items()}
+
+
+def parse_digest_header(value: Optional[str]) -> Dict[str, bytes]:
+    """
+    Parse a Content-Digest / Repr-Digest field (``sha-256=:<base64>:, ...``).
+    Unknown algorithms and malformed members are ignored, as RFC 9530 allows.
+    """
+    digests: Dict[str, bytes] = {}
+    if not value:
+        return digests
+    for member in value.split(","):
+        alg, _, encoded = member.strip().partition("=")
+        alg = alg.strip().lower()
+        encoded = encoded.strip()
+        if alg not in DIGEST_FIELDS or len(encoded) < 2:
+            continue
+        if not (encoded.startswith(":") and encoded.endswith(":")):
+            continue
+        try:
+            digests[alg] = base64.b64decode(encoded[1:-1], validate=True)
+        except binascii.Error:
+            continue
+    return digests
+
+
+def expected_digests(headers: Mapping[str, Any]) -> Dict[str, bytes]:
+    """Digests a client announced through Repr-Digest and/or Content-Digest."""
+    # uploads are never content-encoded here, so both describe the same bytes
+    expected = parse_digest_header(headers.get("repr-digest"))
+    expected.update(parse_digest_header(headers.get("content-digest")))
+    return expected
+
+
+def verify_digests(
+    expected: Dict[str, bytes], actual: Dict[str, bytes], label: str
+) -> None:
+    # an announced digest that was not computed fails too, never passes silently
+    for alg, digest in expected.items():
+        computed = actual.get(alg)
+        if computed is None or not hmac.compare_digest(digest, computed):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Digest mismatch for {label} ({alg}).",
+            )
+
+
+def format_repr_digest(file_detail: Mapping[str, Any]) -> Optional[str]:
+    """Build a Repr-Digest header value from the digests stored for a file."""
+    members = []
+    for alg, field in DIGEST_FIELDS.items():
+        hex_digest = file_detail.get(field)
+        if hex_digest:
+            encoded = base64.b64encode(bytes.fromhex(hex_digest)).decode("ascii")
+            members.append(f"{alg}=:{encoded}:")
+    return ", ".join(members) or None
@@ -1,3 +1,4 @@
+from dataclasses import dataclass
 from datetime import datetime
 from typing import Any, Dict, List, Optional
 
@@ -31,6 +32,13 @@ class Storagebox(SQLModel, table=True):
     )
 
 
+class StoredFile(SQLModel, table=True):
+    """Index from a stored filename to the box it belongs to."""
+
+    stored_filename: str = Field(primary_key=True)
+    box_id: int = Field(nullable=False, index=True)
+
+
 class OtpRequestResponse(SQLModel):
     message: str
     otp: str
@@ -47,6 +55,16 @@ class FileMetadata(SQLModel):
     file_size: Optional[int | None] = None
 
 
+@dataclass(slots=True)
+class FileMetadataRow:
+    """Same shape as FileMetadata, but cheap to build and serialized natively by orjson."""
+
+    original_filename: str
+    file_type: str
+    download_url: str
+    file_size: Optional[int] = None
+
+
 class AccessResponse(SQLModel):
     otp: str
     files: List[FileMetadata]
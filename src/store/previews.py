@@ -0,0 +1,303 @@
+import asyncio
+import mimetypes
+import multiprocessing
+import os
+import pathlib
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, Optional, Tuple
+
+import aiofiles
+import aiofiles.os
+from fastapi import HTTPException, status
+from PIL import Image
+
+from src.store import services
+
+from ..utils.loger import LoggerSetup
+
+logger = LoggerSetup(logger_name=__name__, lazy=True).logger
+
+# tune as needed
+PREVIEW_DIR_NAME = ".previews"
+THUMBNAIL_SIZE = (320, 320)
+TEXT_PREVIEW_BYTES = 4096
+PREVIEW_CACHE_MAX_BYTES = 512 * 1024 * 1024
+PREVIEW_WORKERS = 2
+# sources that failed to render are remembered so retries don't hit the pool
+FAILED_PREVIEWS_MAX = 1024
+
+TEXT_TYPES = {"application/json", "application/xml", "application/javascript"}
+DERIVATIVES = {
+    "image": (".thumb.webp", "image/webp"),
+    "text": (".head.txt", "text/plain; charset=utf-8"),
+}
+
+
+def preview_dir() -> pathlib.Path:
+    # resolved on each call so it follows services.UPLOAD_DIR
+    return services.UPLOAD_DIR / PREVIEW_DIR_NAME
+
+
+def preview_kind(content_type: Optional[str]) -> Optional[str]:
+    if not content_type:
+        return None
+    content_type = content_type.split(";")[0].strip().lower()
+    if content_type.startswith("image/"):
+        return "image"
+    if content_type.startswith("text/") or content_type in TEXT_TYPES:
+        return "text"
+    return None
+
+
+def derivative_paths(stored_filename: str) -> Iterable[pathlib.Path]:
+    for suffix, _ in DERIVATIVES.values():
+        yield preview_dir() / f"{stored_filename}{suffix}"
+
+
+# renderers run in worker processes/threads; they write to a temporary name and
+# rename, so a derivative is either complete or absent
+def _render_thumbnail(source: str, target: str, size: Tuple[int, int]) -> None:
+    tmp = f"{target}.{os.getpid()}.tmp"
+    try:
+        with Image.open(source) as im:
+            im.draft("RGB", size)
+            im.thumbnail(size)
+            if im.mode not in ("RGB", "RGBA"):
+                im = im.convert("RGBA" if "A" in im.getbands() else "RGB")
+            im.save(tmp, format="WEBP", quality=80)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    os.replace(tmp, target)
+
+
+def _render_text_head(source: str, target: str, limit: int) -> None:
+    with open(source, "rb") as f:
+        head = f.read(limit)
+    # cut at the last complete line when the file is longer than the preview
+    if len(head) == limit and b"\n" in head:
+        head = head[: head.rindex(b"\n") + 1]
+    tmp = f"{target}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(head.decode("utf-8", errors="replace"))
+    os.replace(tmp, target)
+
+
+def _unpreviewable() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+        detail="File content could not be previewed.",
+    )
+
+
+def _touch(path: pathlib.Path) -> bool:
+    """Mark a derivative as used; False if it doesn't exist (anymore)."""
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        return False
+    return True
+
+
+def _evict_previews(directory: pathlib.Path, max_bytes: int, keep: pathlib.Path) -> int:
+    """
+    Remove the least recently used derivatives until ``directory`` fits in
+    ``max_bytes``. The directory itself is the index, with mtimes as the LRU
+    clock, so every worker process sees the same cache. Returns the number of
+    files removed; ``keep`` is never one of them.
+    """
+    entries = []
+    for path in directory.iterdir():
+        if path.name.endswith(".tmp"):
+            continue
+        try:
+            entries.append((path, path.stat()))
+        except FileNotFoundError:
+            # evicted by another worker meanwhile
+            continue
+    total = sum(st.st_size for _, st in entries)
+    removed = 0
+    for path, st in sorted(entries, key=lambda e: e[1].st_mtime_ns):
+        if total <= max_bytes:
+            break
+        if path == keep:
+            continue
+        try:
+            path.unlink()
+            removed += 1
+        except FileNotFoundError:
+            pass
+        total -= st.st_size
+    return removed
+
+
+class PreviewGenerator:
+    """
+    Creates and caches preview derivatives of stored files.
+
+    Concurrent requests for the same derivative share one generation task
+    (single-flight), and the derivative directory is kept under
+    ``max_cache_bytes`` by evicting the least recently used previews. Recency
+    and sizes are read from the directory, so the limit holds across workers.
+    """
+
+    def __init__(
+        self,
+        max_cache_bytes: int = PREVIEW_CACHE_MAX_BYTES,
+        workers: int = PREVIEW_WORKERS,
+    ):
+        self.max_cache_bytes = max_cache_bytes
+        self.workers = workers
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._inflight: Dict[pathlib.Path, asyncio.Future] = {}
+        self._failed: OrderedDict[pathlib.Path, None] = OrderedDict()
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # the app process already runs threads, which fork doesn't survive
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("forkserver"),
+            )
+        return self._pool
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    async def _evict(self, keep: pathlib.Path) -> None:
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(
+            None, _evict_previews, keep.parent, self.max_cache_bytes, keep
+        )
+
+    def forget(self, stored_filename: str) -> None:
+        """Drop cached failures of a deleted file; the caller unlinks the files."""
+        for path in derivative_paths(stored_filename):
+            self._failed.pop(path, None)
+
+    def _remember_failure(self, target: pathlib.Path) -> None:
+        self._failed[target] = None
+        while len(self._failed) > FAILED_PREVIEWS_MAX:
+            self._failed.popitem(last=False)
+
+    async def _generate(self, kind: str, source: pathlib.Path, target: pathlib.Path):
+        await aiofiles.os.makedirs(str(target.parent), exist_ok=True)
+        loop = asyncio.get_running_loop()
+        try:
+            if kind == "image":
+                await loop.run_in_executor(
+                    self._get_pool(),
+                    _render_thumbnail,
+                    str(source),
+                    str(target),
+                    THUMBNAIL_SIZE,
+                )
+            else:
+                await loop.run_in_executor(
+                    None,
+                    _render_text_head,
+                    str(source),
+                    str(target),
+                    TEXT_PREVIEW_BYTES,
+                )
+        except FileNotFoundError:
+            raise
+        except (OSError, ValueError, SyntaxError, Image.DecompressionBombError) as e:
+            # content doesn't match its type: not an image, truncated, too large
+            logger.warning(
+                "Failed to render preview.",
+                extra={"source": source.name, "kind": kind},
+                exc_info=True,
+            )
+            self._remember_failure(target)
+            raise _unpreviewable() from e
+        await self._evict(target)
+
+    def _locate(self, stored_filename: str, content_type: Optional[str]):
+        kind = preview_kind(content_type)
+        if kind is None:
+            return None
+        suffix, media_type = DERIVATIVES[kind]
+        target = preview_dir() / f"{stored_filename}{suffix}"
+        return kind, target, media_type
+
+    async def _ensure(self, kind: str, stored_filename: str, target: pathlib.Path):
+        if target in self._failed:
+            self._failed.move_to_end(target)
+            raise _unpreviewable()
+        loop = asyncio.get_running_loop()
+        if await loop.run_in_executor(None, _touch, target):
+            return
+        future = self._inflight.get(target)
+        if future is None:
+            source = services.UPLOAD_DIR / stored_filename
+            future = asyncio.ensure_future(self._generate(kind, source, target))
+            self._inflight[target] = future
+            future.add_done_callback(lambda _: self._inflight.pop(target, None))
+        # shielded so one cancelled request doesn't abort it for the others
+        await asyncio.shield(future)
+
+    async def ensure(self, stored_filename: str, content_type: Optional[str]) -> bool:
+        """Make sure the derivative exists; False if the type has no preview."""
+        located = self._locate(stored_filename, content_type)
+        if located is None:
+            return False
+        kind, target, _ = located
+        await self._ensure(kind, stored_filename, target)
+        return True
+
+    async def get(self, stored_filename: str, content_type: Optional[str]):
+        """
+        Return ``(content, media_type)`` of the preview for a stored file, or
+        None when no preview can be made for its content type.
+        """
+        located = self._locate(stored_filename, content_type)
+        if located is None:
+            return None
+        kind, target, media_type = located
+        for _ in range(2):
+            await self._ensure(kind, stored_filename, target)
+            try:
+                async with aiofiles.open(target, "rb") as f:
+                    return await f.read(), media_type
+            except FileNotFoundError:
+                # evicted between generation and read; generate it once more
+                continue
+        raise FileNotFoundError(str(target))
+
+
+_preview_generator: Optional[PreviewGenerator] = None
+
+
+def get_preview_generator() -> PreviewGenerator:
+    global _preview_generator
+    if _preview_generator is None:
+        _preview_generator = PreviewGenerator()
+    return _preview_generator
+
+
+def shutdown_preview_generator() -> None:
+    if _preview_generator is not None:
+        _preview_generator.shutdown()
+
+
+async def generate_previews(files: Iterable[Tuple[str, Optional[str]]]) -> None:
+    """Best-effort on-upload generation for ``(stored_filename, file_type)`` pairs."""
+    generator = get_preview_generator()
+    for stored_filename, file_type in files:
+        if not file_type or file_type == "application/octet-stream":
+            file_type, _ = mimetypes.guess_type(stored_filename)
+        try:
+            await generator.ensure(stored_filename, file_type)
+        except HTTPException:
+            # unrenderable content, already logged by the generator
+            continue
+        except Exception:
+            logger.exception(
+                "Failed to generate preview.",
+                extra={"stored_filename": stored_filename},
+            )
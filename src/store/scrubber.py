@@ -0,0 +1,153 @@
+import asyncio
+import hashlib
+import os
+import time
+from typing import Optional
+
+import aiofiles
+from prometheus_client import Counter, Gauge
+from sqlmodel import select
+
+from src.configs.db import get_session_maker
+from src.store import services
+from src.store.models import Storagebox
+
+from ..utils.locks import try_lock_file
+from ..utils.loger import LoggerSetup
+
+logger = LoggerSetup(logger_name=__name__, lazy=True).logger
+
+SCRUB_CHUNK_SIZE = 1024 * 1024
+SCRUB_BATCH_SIZE = 100
+SCRUB_LOCK_NAME = ".scrub.lock"
+SCRUB_LOCK_RETRY_SECONDS = 60
+
+scrubbed_files = Counter(
+    "storagebox_scrub_files_total",
+    "Stored files re-verified by the integrity scrubber.",
+    ["result"],
+)
+scrubbed_bytes = Counter(
+    "storagebox_scrub_bytes_total", "Bytes read by the integrity scrubber."
+)
+scrub_last_pass = Gauge(
+    "storagebox_scrub_last_pass_completed_timestamp_seconds",
+    "Unix time at which the last full scrub pass finished.",
+)
+
+
+class IntegrityScrubber:
+    """
+    Background task that re-hashes stored files against the SHA-256 recorded at
+    upload time. Boxes are walked in batches by ``Storagebox.id`` and reads are
+    throttled to ``rate_bytes_per_sec`` so the scrub never competes with
+    downloads for disk bandwidth. Results are exported as Prometheus metrics.
+
+    Every worker may start a scrubber; an flock on a file in UPLOAD_DIR lets
+    only one process per upload directory scrub at a time, and another worker
+    takes over if that process goes away.
+    """
+
+    def __init__(
+        self,
+        rate_bytes_per_sec: int,
+        interval_seconds: float,
+        batch_size: int = SCRUB_BATCH_SIZE,
+    ):
+        self.rate_bytes_per_sec = rate_bytes_per_sec
+        self.interval_seconds = interval_seconds
+        self.batch_size = batch_size
+        # id of the last box checked, so a pass resumes where it left off
+        self.cursor = 0
+        self._task: Optional[asyncio.Task] = None
+
+    async def verify_file(self, stored_filename: str, expected_sha256: str) -> str:
+        path = services.UPLOAD_DIR / stored_filename
+        digest = hashlib.sha256()
+        try:
+            async with aiofiles.open(path, "rb") as f:
+                while chunk := await f.read(SCRUB_CHUNK_SIZE):
+                    started = time.monotonic()
+                    digest.update(chunk)
+                    scrubbed_bytes.inc(len(chunk))
+                    budget = len(chunk) / self.rate_bytes_per_sec
+                    await asyncio.sleep(max(0.0, budget - (time.monotonic() - started)))
+        except FileNotFoundError:
+            return "missing"
+        return "ok" if digest.hexdigest() == expected_sha256 else "corrupt"
+
+    async def run_batch(self) -> bool:
+        """Verify the next batch of boxes; returns False once a pass is complete."""
+        async with get_session_maker()() as session:
+            statement = (
+                select(Storagebox)
+                .where(Storagebox.id > self.cursor)
+                .order_by(Storagebox.id)
+                .limit(self.batch_size)
+            )
+            records = (await session.exec(statement)).all()
+        if not records:
+            self.cursor = 0
+            return False
+
+        for record in records:
+            for fd in record.file_details or []:
+                stored_filename = fd.get("stored_filename")
+                expected = fd.get("sha256")
+                if not stored_filename or not expected:
+                    scrubbed_files.labels(result="skipped").inc()
+                    continue
+                result = await self.verify_file(stored_filename, expected)
+                scrubbed_files.labels(result=result).inc()
+                if result != "ok":
+                    logger.error(
+                        "Stored file failed integrity check.",
+                        extra={
+                            "otp": record.otp,
+                            "stored_filename": stored_filename,
+                            "result": result,
+                        },
+                    )
+            self.cursor = record.id
+        return True
+
+    async def run_pass(self) -> None:
+        while await self.run_batch():
+            pass
+        scrub_last_pass.set_to_current_time()
+        logger.info("Integrity scrub pass completed.")
+
+    async def acquire_lock(self) -> int:
+        path = services.ensure_upload_dir() / SCRUB_LOCK_NAME
+        while (fd := try_lock_file(path)) is None:
+            await asyncio.sleep(SCRUB_LOCK_RETRY_SECONDS)
+        logger.info("Integrity scrubber running in this process.")
+        return fd
+
+    async def run_forever(self) -> None:
+        lock_fd = await self.acquire_lock()
+        try:
+            while True:
+                try:
+                    await self.run_pass()
+                except asyncio.CancelledError:
+                    raise
+                except Exception:
+                    logger.exception("Integrity scrub pass failed.")
+                await asyncio.sleep(self.interval_seconds)
+        finally:
+            # closing the fd releases the lock for the other workers
+            os.close(lock_fd)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self.run_forever())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
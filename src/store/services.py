@@ -1,5 +1,6 @@
 import asyncio
 import mimetypes
+import os
 import pathlib
 import secrets
 import string
@@ -11,18 +12,24 @@ from typing import Any, Dict, List, Optional
 
 import aiofiles
 import aiofiles.os
-from fastapi import File, HTTPException, UploadFile, status
+from fastapi import File, HTTPException, Request, UploadFile, status
+from sqlalchemy import delete
 from sqlalchemy.exc import IntegrityError
-from sqlmodel import select
+from sqlmodel import select, text
 
 from src.configs.db import SessionDep
-from src.store.models import Storagebox
+from src.replication.models import BoxChange
+from src.store.integrity import FileDigester, expected_digests, verify_digests
+from src.store.models import FileMetadataRow, Storagebox, StoredFile
+from src.store.streaming import StreamingUploadParser
 
 from ..utils.loger import LoggerSetup
 
 BASE_DIR = pathlib.Path(__file__).parent.parent.parent
-UPLOAD_DIR = BASE_DIR / "uploads"
-UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
+# read from the environment directly (not Settings) to keep import free of config
+# loading; lets several nodes run side by side on one host
+UPLOAD_DIR = pathlib.Path(os.getenv("UPLOAD_DIR") or BASE_DIR / "uploads")
+_upload_dir_ready = False
 _logger_setup: Optional[LoggerSetup] = None
 
 # tune as needed
@@ -30,19 +37,41 @@ OTP_RETRY = 5
 CHUNK_SIZE = 8192
 MAX_FILE_SIZE_BYTES = 50 * 1024 * 1024  # 50 MB per file
 # threadpool used for sync-heavy operations (zip creation, path.exists checks) to avoid blocking loop
-_threadpool = ThreadPoolExecutor(max_workers=2)
+_threadpool: Optional[ThreadPoolExecutor] = None
 
 
 def get_logger():
     global _logger_setup
     if _logger_setup is None:
-        _logger_setup = LoggerSetup(logger_name=__name__)
+        _logger_setup = LoggerSetup(logger_name=__name__, lazy=True)
     return _logger_setup.logger
 
 
 logger = get_logger()
 
 
+def ensure_upload_dir() -> pathlib.Path:
+    global _upload_dir_ready
+    if not _upload_dir_ready:
+        UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
+        _upload_dir_ready = True
+    return UPLOAD_DIR
+
+
+def get_threadpool() -> ThreadPoolExecutor:
+    global _threadpool
+    if _threadpool is None:
+        _threadpool = ThreadPoolExecutor(max_workers=2)
+    return _threadpool
+
+
+def shutdown_threadpool() -> None:
+    global _threadpool
+    if _threadpool is not None:
+        _threadpool.shutdown(wait=True)
+        _threadpool = None
+
+
 def _sanitize_filename(name: str) -> str:
     # keep only final name, strip any path components and control characters
     cleaned = pathlib.Path(name).name
@@ -51,6 +80,66 @@ def _sanitize_filename(name: str) -> str:
     return cleaned[:255]  # cap length
 
 
+async def _remove_stored_files(paths: List[pathlib.Path], message: str) -> None:
+    for p in paths:
+        try:
+            if await aiofiles.os.path.exists(str(p)):
+                await aiofiles.os.remove(str(p))
+        except Exception:
+            logger.exception(message)
+
+
+async def _persist_file_details(
+    session: SessionDep,
+    file_details: List[Dict[str, Any]],
+    stored_paths: List[pathlib.Path],
+) -> Dict[str, Any]:
+    # generate unique OTP and persist; handle unique constraint robustly
+    created: Optional[Storagebox] = None
+    for _ in range(OTP_RETRY):
+        otp6 = "".join(secrets.choice(string.digits) for _ in range(6))
+        box = Storagebox(otp=otp6, file_details=file_details)
+        session.add(box)
+        try:
+            await session.flush()
+            add_stored_file_index(session, box.id, file_details)
+            # replication change log entry, committed together with the box
+            session.add(BoxChange(box_id=box.id, otp=box.otp))
+            await session.commit()
+            await session.refresh(box)
+            created = box
+            break
+        except IntegrityError as ie:
+            await session.rollback()
+            # best-effort: assume unique constraint on otp caused it; log and retry
+            logger.warning(
+                "IntegrityError while committing Storagebox; retrying OTP",
+                extra={"exc": str(ie)},
+            )
+            continue
+
+    if created is None:
+        # cleanup stored files
+        await _remove_stored_files(
+            stored_paths, "Failed to remove orphaned file during cleanup."
+        )
+
+        logger.error("Failed to generate unique OTP after retries.")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Could not generate unique OTP, try again later.",
+        )
+
+    logger.info("File(s) stored successfully.", extra={"otp": created.otp})
+    return {
+        "message": "Files stored successfully",
+        "files": [f["original_filename"] for f in file_details],
+        "stored_files": [(f["stored_filename"], f["file_type"]) for f in file_details],
+        "otp": created.otp,
+        "id": created.id,
+    }
+
+
 async def add_file(session: SessionDep, files: List[UploadFile] = File(...)):
     if not files:
         raise HTTPException(
@@ -60,6 +149,7 @@ async def add_file(session: SessionDep, files: List[UploadFile] = File(...)):
 
     file_details: List[Dict[str, Any]] = []
     stored_paths: List[pathlib.Path] = []
+    ensure_upload_dir()
 
     try:
         # store incoming files
@@ -68,8 +158,12 @@ async def add_file(session: SessionDep, files: List[UploadFile] = File(...)):
             unique_filename = f"{uuid.uuid4().hex}_{original_filename}"
             secure_file_path = UPLOAD_DIR / unique_filename
 
-            # stream write and enforce per-file size limit
+            # track before writing so a rejected partial file is cleaned up too
+            stored_paths.append(secure_file_path)
+
+            # stream write, digest inline and enforce per-file size limit
             written = 0
+            digester = FileDigester()
             async with aiofiles.open(secure_file_path, "wb") as f:
                 while chunk := await file.read(CHUNK_SIZE):
                     written += len(chunk)
@@ -78,7 +172,11 @@ async def add_file(session: SessionDep, files: List[UploadFile] = File(...)):
                             status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
                             detail=f"File {original_filename} exceeds allowed size.",
                         )
+                    digester.update(chunk)
                     await f.write(chunk)
+            verify_digests(
+                expected_digests(file.headers), digester.digests(), original_filename
+            )
 
             stat = await aiofiles.os.stat(str(secure_file_path))
             size = stat.st_size
@@ -89,73 +187,65 @@ async def add_file(session: SessionDep, files: List[UploadFile] = File(...)):
                     "stored_filename": unique_filename,
                     "file_type": file.content_type,
                     "file_size": size,
+                    **digester.details(),
                 }
             )
-            stored_paths.append(secure_file_path)
 
-        # generate unique OTP and persist; handle unique constraint robustly
-        created: Optional[Storagebox] = None
-        for _ in range(OTP_RETRY):
-            otp6 = "".join(secrets.choice(string.digits) for _ in range(6))
-            box = Storagebox(otp=otp6, file_details=file_details)
-            session.add(box)
-            try:
-                await session.commit()
-                await session.refresh(box)
-                created = box
-                break
-            except IntegrityError as ie:
-                await session.rollback()
-                # best-effort: assume unique constraint on otp caused it; log and retry
-                logger.warning(
-                    "IntegrityError while committing Storagebox; retrying OTP",
-                    extra={"exc": str(ie)},
-                )
-                continue
+        return await _persist_file_details(session, file_details, stored_paths)
+
+    except HTTPException:
+        # propagate known HTTP errors after ensuring any stored files are cleaned
+        await _remove_stored_files(
+            stored_paths,
+            "Failed to remove orphaned file during cleanup after HTTPException.",
+        )
+        raise
+    except Exception as exc:
+        logger.exception("Error occurred during file upload.")
+        await _remove_stored_files(
+            stored_paths, "Failed to remove orphaned file during cleanup after error."
+        )
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Internal server error.",
+        ) from exc
 
-        if created is None:
-            # cleanup stored files
-            for p in stored_paths:
-                try:
-                    if await aiofiles.os.path.exists(str(p)):
-                        await aiofiles.os.remove(str(p))
-                except Exception:
-                    logger.exception("Failed to remove orphaned file during cleanup.")
 
-            logger.error("Failed to generate unique OTP after retries.")
+async def add_file_stream(session: SessionDep, request: Request):
+    """
+    Store the files of a multipart request body while it is being received.
+
+    Parts are written directly into UPLOAD_DIR (no spooled temporary copy) and
+    the upload is aborted as soon as a part exceeds MAX_FILE_SIZE_BYTES.
+    """
+    parser = StreamingUploadParser(
+        headers=request.headers,
+        stream=request.stream(),
+        upload_dir=ensure_upload_dir(),
+        max_file_size=MAX_FILE_SIZE_BYTES,
+        sanitize_filename=_sanitize_filename,
+    )
+    try:
+        file_details = await parser.parse()
+        if not file_details:
             raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="Could not generate unique OTP, try again later.",
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="Please provide file(s).",
             )
-
-        logger.info("File(s) stored successfully.", extra={"otp": created.otp})
-        return {
-            "message": "Files stored successfully",
-            "files": [f["original_filename"] for f in file_details],
-            "otp": created.otp,
-        }
+        return await _persist_file_details(session, file_details, parser.stored_paths)
 
     except HTTPException:
-        # propagate known HTTP errors after ensuring any stored files are cleaned
-        for p in stored_paths:
-            try:
-                if await aiofiles.os.path.exists(str(p)):
-                    await aiofiles.os.remove(str(p))
-            except Exception:
-                logger.exception(
-                    "Failed to remove orphaned file during cleanup after HTTPException."
-                )
+        await _remove_stored_files(
+            parser.stored_paths,
+            "Failed to remove orphaned file during cleanup after HTTPException.",
+        )
         raise
     except Exception as exc:
-        logger.exception("Error occurred during file upload.")
-        for p in stored_paths:
-            try:
-                if await aiofiles.os.path.exists(str(p)):
-                    await aiofiles.os.remove(str(p))
-            except Exception:
-                logger.exception(
-                    "Failed to remove orphaned file during cleanup after error."
-                )
+        logger.exception("Error occurred during streamed file upload.")
+        await _remove_stored_files(
+            parser.stored_paths,
+            "Failed to remove orphaned file during cleanup after error.",
+        )
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Internal server error.",
@@ -191,7 +281,18 @@ async def get_store_record_by_otp(session: SessionDep, otp: str):
     return file_record
 
 
-async def get_file_info_for_otp(session: SessionDep, otp: str):
+def _existing_paths(paths: List[pathlib.Path]) -> List[bool]:
+    return [p.exists() for p in paths]
+
+
+async def _iter_valid_file_details(session: SessionDep, otp: str):
+    """
+    Yield (original_filename, stored_filename, file_type, file_size, path) for
+    every file of the OTP's box that is still present on disk.
+
+    Existence of all files is checked in a single executor call instead of one
+    thread hop per file.
+    """
     file_record = await get_store_record_by_otp(session, otp)
     if not isinstance(file_record.file_details, list) or not file_record.file_details:
         raise HTTPException(
@@ -199,44 +300,88 @@ async def get_file_info_for_otp(session: SessionDep, otp: str):
             detail="File details are missing or corrupted.",
         )
 
-    files_info: List[Dict[str, Any]] = []
+    candidates = []
     for file_detail in file_record.file_details:
-        original_filename = file_detail.get("original_filename", "downloaded_file")
-        stored_filename = file_detail.get("stored_filename")
-        file_type = file_detail.get("file_type")
-
-        if not stored_filename:
+        if not file_detail.get("stored_filename"):
             logger.warning(
                 "Missing stored_filename in file_detail",
                 extra={"file_detail": file_detail},
             )
             continue
-        file_path_on_disk = UPLOAD_DIR / stored_filename
-        if not await aiofiles.os.path.exists(str(file_path_on_disk)):
+        candidates.append(file_detail)
+
+    paths = [UPLOAD_DIR / fd["stored_filename"] for fd in candidates]
+    loop = asyncio.get_running_loop()
+    exists = await loop.run_in_executor(None, _existing_paths, paths)
+
+    found = False
+    for file_detail, file_path_on_disk, present in zip(candidates, paths, exists):
+        stored_filename = file_detail["stored_filename"]
+        if not present:
             logger.warning(
                 "Stored file missing on disk",
                 extra={"stored_filename": stored_filename},
             )
             continue
+        original_filename = file_detail.get("original_filename", "downloaded_file")
+        file_type = file_detail.get("file_type")
         if not file_type or file_type == "application/octet-stream":
             guessed_type, _ = mimetypes.guess_type(original_filename)
             file_type = guessed_type if guessed_type else "application/octet-stream"
-        files_info.append(
-            {
-                "original_filename": original_filename,
-                "stored_filename": stored_filename,
-                "file_type": file_type,
-                "file_size": file_detail.get("file_size"),
-                "file_path": str(file_path_on_disk),
-            }
+        found = True
+        yield (
+            original_filename,
+            stored_filename,
+            file_type,
+            file_detail.get("file_size"),
+            file_path_on_disk,
         )
 
-    if not files_info:
+    if not found:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="No valid files found for this OTP.",
         )
-    return files_info
+
+
+async def get_file_info_for_otp(session: SessionDep, otp: str):
+    return [
+        {
+            "original_filename": original_filename,
+            "stored_filename": stored_filename,
+            "file_type": file_type,
+            "file_size": file_size,
+            "file_path": str(file_path_on_disk),
+        }
+        async for (
+            original_filename,
+            stored_filename,
+            file_type,
+            file_size,
+            file_path_on_disk,
+        ) in _iter_valid_file_details(session, otp)
+    ]
+
+
+async def get_file_metadata_for_otp(
+    session: SessionDep, otp: str, download_url_prefix: str
+) -> List[FileMetadataRow]:
+    """
+    Fast path for the access route: builds slotted rows that orjson serializes
+    directly, without intermediate dicts or model validation.
+    """
+    return [
+        FileMetadataRow(
+            original_filename, file_type, download_url_prefix + stored_filename, size
+        )
+        async for (
+            original_filename,
+            stored_filename,
+            file_type,
+            size,
+            _,
+        ) in _iter_valid_file_details(session, otp)
+    ]
 
 
 # helper used to create zip in a thread (sync code) to avoid blocking event loop
@@ -267,7 +412,7 @@ async def generate_file_zip(files_data: List[Dict[str, Any]]):
         # run sync zip creation in threadpool
         loop = asyncio.get_running_loop()
         await loop.run_in_executor(
-            _threadpool, _create_zip_file_on_disk, files_data, str(tmp_path)
+            get_threadpool(), _create_zip_file_on_disk, files_data, str(tmp_path)
         )
 
         # stream the zip file
@@ -287,6 +432,43 @@ async def generate_file_zip(files_data: List[Dict[str, Any]]):
                 logger.exception("Failed to remove temporary zip file.")
 
 
+def add_stored_file_index(
+    session: SessionDep, box_id: int, file_details: List[Dict[str, Any]]
+) -> None:
+    """Index the box's files by stored filename; part of the caller's transaction."""
+    session.add_all(
+        StoredFile(stored_filename=fd["stored_filename"], box_id=box_id)
+        for fd in file_details
+        if fd.get("stored_filename")
+    )
+
+
+async def remove_stored_file_index(session: SessionDep, box_ids: List[int]) -> None:
+    await session.exec(delete(StoredFile).where(StoredFile.box_id.in_(box_ids)))
+
+
+async def backfill_stored_file_index(session: SessionDep) -> int:
+    """
+    Fill the StoredFile index from file_details when it is empty but boxes
+    exist, i.e. on the first start after the table was added. Returns the
+    number of rows written.
+    """
+    if (await session.exec(select(StoredFile.stored_filename).limit(1))).first():
+        return 0
+    if not (await session.exec(select(Storagebox.id).limit(1))).first():
+        return 0
+    result = await session.execute(
+        text(
+            "INSERT OR IGNORE INTO storedfile (stored_filename, box_id) "
+            "SELECT json_extract(json_each.value, '$.stored_filename'), storagebox.id "
+            "FROM storagebox, json_each(storagebox.file_details) "
+            "WHERE json_extract(json_each.value, '$.stored_filename') IS NOT NULL"
+        )
+    )
+    await session.commit()
+    return result.rowcount
+
+
 async def get_store_record_by_stored_filename(
     session: SessionDep, stored_filename: str
 ):
@@ -299,15 +481,29 @@ async def get_store_record_by_stored_filename(
             status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid stored_filename."
         )
 
-    statement = select(Storagebox)
+    # primary key lookup in the StoredFile index, then the box by its id
+    statement = (
+        select(Storagebox)
+        .join(StoredFile, StoredFile.box_id == Storagebox.id)
+        .where(StoredFile.stored_filename == stored_filename)
+    )
     result = await session.exec(statement)
-    # iterate candidates and check their file_details for matching stored_filename
-    for record in result.all():
-        details = getattr(record, "file_details", []) or []
-        for fd in details:
-            if fd.get("stored_filename") == stored_filename:
-                return record
+    record = result.first()
+    if record is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Record not found for stored filename.",
+        )
+    return record
 
+
+async def get_file_detail_by_stored_filename(
+    session: SessionDep, stored_filename: str
+) -> Dict[str, Any]:
+    record = await get_store_record_by_stored_filename(session, stored_filename)
+    for fd in record.file_details or []:
+        if fd.get("stored_filename") == stored_filename:
+            return fd
     raise HTTPException(
         status_code=status.HTTP_404_NOT_FOUND,
         detail="Record not found for stored filename.",
@@ -0,0 +1,230 @@
+import pathlib
+import uuid
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+import aiofiles
+from fastapi import HTTPException, status
+from python_multipart.exceptions import FormParserError
+from python_multipart.multipart import MultipartParser, parse_options_header
+from starlette.datastructures import Headers
+
+from src.store.integrity import FileDigester, expected_digests, verify_digests
+
+# non-file form fields are ignored, but still bounded so they can't be abused
+MAX_FIELD_SIZE_BYTES = 64 * 1024
+# parts per request, same defaults as Starlette's form parser
+MAX_FILES = 1000
+MAX_FIELDS = 1000
+
+
+class StreamingUploadParser:
+    """
+    Incremental multipart/form-data parser that writes every file part straight
+    to its final location in ``upload_dir``.
+
+    Unlike ``UploadFile`` there is no intermediate spooled temporary file: each
+    chunk read from the request stream is hashed and appended to the destination
+    file as soon as it is parsed, and the per-file size limit is enforced while
+    the body is still being received.
+
+    Digests sent by the client are verified as well: per file through the part
+    headers, and for the whole body through the request's Content-Digest.
+    """
+
+    def __init__(
+        self,
+        headers: Headers,
+        stream: AsyncIterator[bytes],
+        upload_dir: pathlib.Path,
+        max_file_size: int,
+        sanitize_filename: Callable[[str], str],
+        max_files: Optional[int] = None,
+        max_fields: Optional[int] = None,
+    ) -> None:
+        self.headers = headers
+        self.stream = stream
+        self.upload_dir = upload_dir
+        self.max_file_size = max_file_size
+        self.sanitize_filename = sanitize_filename
+        self.max_files = MAX_FILES if max_files is None else max_files
+        self.max_fields = MAX_FIELDS if max_fields is None else max_fields
+        # every path opened so far (including partial ones), so callers can clean
+        # up on parse errors as well as on later failures
+        self.stored_paths: List[pathlib.Path] = []
+        self.file_details: List[Dict[str, Any]] = []
+
+        self._events: List[Tuple[str, Any]] = []
+        self._header_field = b""
+        self._header_value = b""
+        self._part_headers: Dict[bytes, bytes] = {}
+        self._is_file_part = False
+        self._field_size = 0
+        self._file_count = 0
+        self._field_count = 0
+
+    # parser callbacks (sync): only record events, the I/O happens in parse()
+    def on_part_begin(self) -> None:
+        self._part_headers = {}
+        self._is_file_part = False
+        self._field_size = 0
+
+    def on_header_field(self, data: bytes, start: int, end: int) -> None:
+        self._header_field += data[start:end]
+
+    def on_header_value(self, data: bytes, start: int, end: int) -> None:
+        self._header_value += data[start:end]
+
+    def on_header_end(self) -> None:
+        self._part_headers[self._header_field.lower()] = self._header_value
+        self._header_field = b""
+        self._header_value = b""
+
+    def on_headers_finished(self) -> None:
+        _, options = parse_options_header(
+            self._part_headers.get(b"content-disposition", b"")
+        )
+        if b"filename" not in options:
+            self._field_count += 1
+            if self._field_count > self.max_fields:
+                raise HTTPException(
+                    status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                    detail=f"Too many form fields. Maximum is {self.max_fields}.",
+                )
+            return
+        self._file_count += 1
+        if self._file_count > self.max_files:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=f"Too many files. Maximum is {self.max_files}.",
+            )
+        self._is_file_part = True
+        filename = options[b"filename"].decode("utf-8", errors="replace")
+        content_type = self._part_headers.get(b"content-type", b"").decode("latin-1")
+        self._events.append(
+            ("open", (filename, content_type or None, self._part_headers))
+        )
+
+    def on_part_data(self, data: bytes, start: int, end: int) -> None:
+        if self._is_file_part:
+            self._events.append(("data", data[start:end]))
+            return
+        self._field_size += end - start
+        if self._field_size > MAX_FIELD_SIZE_BYTES:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail="Form field exceeds allowed size.",
+            )
+
+    def on_part_end(self) -> None:
+        if self._is_file_part:
+            self._events.append(("close", None))
+
+    def _boundary(self) -> bytes:
+        content_type, params = parse_options_header(
+            self.headers.get("content-type", "")
+        )
+        if content_type != b"multipart/form-data":
+            raise HTTPException(
+                status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+                detail="Expected multipart/form-data.",
+            )
+        boundary = params.get(b"boundary")
+        if not boundary:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Missing boundary in multipart.",
+            )
+        return boundary
+
+    async def parse(self) -> List[Dict[str, Any]]:
+        parser = MultipartParser(
+            self._boundary(),
+            {
+                "on_part_begin": self.on_part_begin,
+                "on_part_data": self.on_part_data,
+                "on_part_end": self.on_part_end,
+                "on_header_field": self.on_header_field,
+                "on_header_value": self.on_header_value,
+                "on_header_end": self.on_header_end,
+                "on_headers_finished": self.on_headers_finished,
+            },
+        )
+
+        body_expected = expected_digests(self.headers)
+        body_digester = FileDigester() if body_expected else None
+        current: Optional[Dict[str, Any]] = None
+        digester: Optional[FileDigester] = None
+        part_expected: Dict[str, bytes] = {}
+        out = None
+        try:
+            async for chunk in self.stream:
+                if body_digester is not None:
+                    body_digester.update(chunk)
+                parser.write(chunk)
+                for kind, payload in self._events:
+                    if kind == "open":
+                        filename, content_type, part_headers = payload
+                        original_filename = self.sanitize_filename(
+                            filename or "uploaded_file"
+                        )
+                        unique_filename = f"{uuid.uuid4().hex}_{original_filename}"
+                        path = self.upload_dir / unique_filename
+                        self.stored_paths.append(path)
+                        out = await aiofiles.open(path, "wb")
+                        digester = FileDigester()
+                        part_expected = expected_digests(
+                            {
+                                k.decode("latin-1"): v.decode("latin-1")
+                                for k, v in part_headers.items()
+                            }
+                        )
+                        current = {
+                            "original_filename": original_filename,
+                            "stored_filename": unique_filename,
+                            "file_type": content_type,
+                            "file_size": 0,
+                        }
+                    elif kind == "data":
+                        current["file_size"] += len(payload)
+                        if current["file_size"] > self.max_file_size:
+                            raise HTTPException(
+                                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                                detail=f"File {current['original_filename']} exceeds allowed size.",
+                            )
+                        digester.update(payload)
+                        await out.write(payload)
+                    else:
+                        await out.close()
+                        out = None
+                        verify_digests(
+                            part_expected,
+                            digester.digests(),
+                            current["original_filename"],
+                        )
+                        current.update(digester.details())
+                        self.file_details.append(current)
+                        current = None
+                self._events.clear()
+            parser.finalize()
+            if current is not None:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="Truncated multipart body.",
+                )
+            if body_digester is not None:
+                verify_digests(body_expected, body_digester.digests(), "request body")
+        except FormParserError as exc:
+            await self._close(out)
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Malformed multipart body.",
+            ) from exc
+        except BaseException:
+            await self._close(out)
+            raise
+        return self.file_details
+
+    @staticmethod
+    async def _close(out) -> None:
+        if out is not None:
+            await out.close()
@@ -0,0 +1,19 @@
+import fcntl
+import os
+import pathlib
+from typing import Optional
+
+
+def try_lock_file(path: pathlib.Path) -> Optional[int]:
+    """
+    Take an exclusive flock on ``path`` without blocking; returns its fd, or
+    None if another process holds it. Closing the fd releases the lock, and
+    the kernel releases it when the holder exits.
+    """
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        os.close(fd)
+        return None
+    return fd
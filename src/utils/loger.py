@@ -1,48 +1,97 @@
+import atexit
 import logging
 import logging.handlers
 import os
 import queue
 import sys
+import threading
+from typing import Optional
 
 from pythonjsonlogger import jsonlogger
 
 log_queue = queue.Queue(-1)
 
+# a single listener drains log_queue for every configured logger; it is started
+# by the first record emitted in a process (again after a fork), so importing
+# modules never spawns threads and records are never left in the queue
+_listener: Optional[logging.handlers.QueueListener] = None
+_listener_pid: Optional[int] = None
+_listener_lock = threading.Lock()
+
+
+def _build_handlers():
+    log_dir = "logs"
+    try:
+        os.makedirs(log_dir, exist_ok=True)
+    except OSError as e:
+        print(f"Error creating log directory: {e}", file=sys.stderr)
+    LOG_FORMAT = "%(asctime)s %(levelname)s %(name)s %(message)s"
+    json_formatter = jsonlogger.JsonFormatter(
+        LOG_FORMAT, rename_fields={"levelname": "level", "asctime": "timestamp"}
+    )
+    console_handler = logging.StreamHandler(sys.stdout)
+    console_handler.setFormatter(json_formatter)
+    console_handler.setLevel(logging.DEBUG)
+    log_file_path = os.path.join(log_dir, "app.log")
+    file_handler = logging.handlers.TimedRotatingFileHandler(
+        filename=log_file_path,
+        when="midnight",
+        backupCount=7,
+        encoding="utf-8",
+        delay=True,
+    )
+    file_handler.setFormatter(json_formatter)
+    file_handler.setLevel(logging.INFO)
+    return console_handler, file_handler
+
+
+def start_listener() -> logging.handlers.QueueListener:
+    """Start the shared queue listener for this process (idempotent)."""
+    global _listener, _listener_pid
+    with _listener_lock:
+        # a listener inherited through fork has no thread in the child
+        if _listener is None or _listener_pid != os.getpid():
+            _listener = logging.handlers.QueueListener(
+                log_queue, *_build_handlers(), respect_handler_level=True
+            )
+            _listener.start()
+            _listener_pid = os.getpid()
+        return _listener
+
+
+def stop_listener() -> None:
+    global _listener, _listener_pid
+    with _listener_lock:
+        if _listener is not None and _listener_pid == os.getpid():
+            _listener.stop()
+        _listener = None
+        _listener_pid = None
+
+
+# flush whatever is still queued when the interpreter exits
+atexit.register(stop_listener)
+
+
+class LazyQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that makes sure this process has a listener draining it."""
+
+    def emit(self, record: logging.LogRecord) -> None:
+        if _listener_pid != os.getpid():
+            start_listener()
+        super().emit(record)
+
 
 class LoggerSetup:
-    def __init__(self, logger_name: str = __name__):
+    def __init__(self, logger_name: str = __name__, lazy: bool = False):
         self.logger = logging.getLogger(logger_name)
         if not self.logger.hasHandlers():
             self.setup_logging()
+        # module-level loggers pass lazy=True so that importing them stays
+        # cheap; the listener then starts with the first record they emit
+        self.listener = None if lazy else start_listener()
 
     def setup_logging(self):
-        log_dir = "logs"
-        try:
-            os.makedirs(log_dir, exist_ok=True)
-        except OSError as e:
-            print(f"Error creating log directory: {e}", file=sys.stderr)
-        LOG_FORMAT = "%(asctime)s %(levelname)s %(name)s %(message)s"
-        json_formatter = jsonlogger.JsonFormatter(
-            LOG_FORMAT, rename_fields={"levelname": "level", "asctime": "timestamp"}
-        )
-        console_handler = logging.StreamHandler(sys.stdout)
-        console_handler.setFormatter(json_formatter)
-        console_handler.setLevel(logging.DEBUG)
-        log_file_path = os.path.join(log_dir, "app.log")
-        file_handler = logging.handlers.TimedRotatingFileHandler(
-            filename=log_file_path,
-            when="midnight",
-            backupCount=7,
-            encoding="utf-8",
-            delay=True,
-        )
-        file_handler.setFormatter(json_formatter)
-        file_handler.setLevel(logging.INFO)
-        queue_handler = logging.handlers.QueueHandler(log_queue)
+        queue_handler = LazyQueueHandler(log_queue)
         self.logger.addHandler(queue_handler)
         self.logger.setLevel(logging.DEBUG)
         self.logger.propagate = False
-        self.listener = logging.handlers.QueueListener(
-            log_queue, console_handler, file_handler, respect_handler_level=True
-        )
-        self.listener.start()
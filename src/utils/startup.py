@@ -0,0 +1,23 @@
+import time
+from contextlib import contextmanager
+from typing import Dict
+
+
+class StartupTimer:
+    """Collects wall-clock durations of the individual startup steps."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.timings: Dict[str, float] = {}
+
+    @contextmanager
+    def step(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = round((time.perf_counter() - start) * 1000, 3)
+
+    def report(self) -> Dict[str, float]:
+        total = round((time.perf_counter() - self.started) * 1000, 3)
+        return {**self.timings, "total": total}
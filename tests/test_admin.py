@@ -0,0 +1,119 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from httpx import AsyncClient
+
+from src.configs.configs import Settings, get_settings
+from src.main import app
+from src.store import services
+
+API_KEY = "test-admin-key"
+AUTH = {"X-API-Key": API_KEY}
+
+
+@pytest.fixture(autouse=True)
+def admin_settings(tmp_path, monkeypatch):
+    monkeypatch.setattr(services, "UPLOAD_DIR", tmp_path)
+    app.dependency_overrides[get_settings] = lambda: Settings(
+        DATABASE_URI="test.db", API_KEY=API_KEY
+    )
+    yield
+    app.dependency_overrides.pop(get_settings, None)
+
+
+async def upload(client: AsyncClient, *sizes: int) -> str:
+    response = await client.post(
+        "/store/stream",
+        files=[("files", (f"f{i}.bin", b"x" * size)) for i, size in enumerate(sizes)],
+    )
+    assert response.status_code == 201
+    return response.json()["otp"]
+
+
+@pytest.mark.anyio
+async def test_admin_routes_require_api_key(client: AsyncClient):
+    assert (await client.get("/admin/boxes")).status_code == 401
+    response = await client.get("/admin/boxes", headers={"X-API-Key": "wrong"})
+    assert response.status_code == 401
+
+
+@pytest.mark.anyio
+async def test_list_boxes_keyset_pagination(client: AsyncClient):
+    for size in (1, 2, 3):
+        await upload(client, size, 10)
+
+    seen, cursor, pages = [], 0, []
+    while cursor is not None:
+        response = await client.get(
+            "/admin/boxes", params={"after_id": cursor, "limit": 2}, headers=AUTH
+        )
+        assert response.status_code == 200
+        body = response.json()
+        pages.append(body)
+        seen.extend(body["boxes"])
+        cursor = body["next_cursor"]
+
+    first = pages[0]
+    assert [b["id"] for b in seen] == sorted({b["id"] for b in seen})
+    assert len(seen) == first["total_boxes"]
+    assert sum(b["total_size"] for b in seen) == first["total_size"]
+    assert all(p["total_boxes"] is None for p in pages[1:])
+    assert {b["total_size"] for b in seen[-3:]} == {11, 12, 13}
+    assert all(b["file_count"] == 2 for b in seen[-3:])
+
+
+@pytest.mark.anyio
+async def test_delete_box_by_otp_removes_record_and_files(
+    client: AsyncClient, tmp_path
+):
+    otp = await upload(client, 5, 7)
+    assert len(list(tmp_path.iterdir())) == 2
+
+    response = await client.delete(f"/admin/boxes/{otp}", headers=AUTH)
+    assert response.status_code == 200
+    assert response.json() == {
+        "deleted_boxes": 1,
+        "deleted_files": 2,
+        "freed_bytes": 12,
+    }
+    assert list(tmp_path.iterdir()) == []
+    response = await client.post("/store/access", json={"otp": otp})
+    assert response.status_code == 404
+
+
+@pytest.mark.anyio
+async def test_bulk_delete_by_size_and_age(client: AsyncClient, tmp_path):
+    small = await upload(client, 1)
+    large = await upload(client, 4096)
+
+    response = await client.post(
+        "/admin/boxes/bulk-delete",
+        json={"min_total_size": 4096, "dry_run": True},
+        headers=AUTH,
+    )
+    assert response.json()["deleted_boxes"] >= 1
+    assert (await client.post("/store/access", json={"otp": large})).status_code == 200
+
+    response = await client.post(
+        "/admin/boxes/bulk-delete", json={"min_total_size": 4096}, headers=AUTH
+    )
+    assert response.status_code == 200
+    assert (await client.post("/store/access", json={"otp": large})).status_code == 404
+    assert (await client.post("/store/access", json={"otp": small})).status_code == 200
+
+    future = datetime.now(timezone.utc) + timedelta(days=1)
+    response = await client.post(
+        "/admin/boxes/bulk-delete",
+        json={"created_before": future.isoformat()},
+        headers=AUTH,
+    )
+    assert response.status_code == 200
+    listing = (await client.get("/admin/boxes", headers=AUTH)).json()
+    assert listing["total_boxes"] == 0
+    assert list(tmp_path.iterdir()) == []
+
+
+@pytest.mark.anyio
+async def test_bulk_delete_requires_criteria(client: AsyncClient):
+    response = await client.post("/admin/boxes/bulk-delete", json={}, headers=AUTH)
+    assert response.status_code == 422
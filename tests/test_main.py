@@ -7,3 +7,72 @@ async def test_health_endpoint(client: AsyncClient):
     response = await client.get("/")
     assert response.status_code == 200
     assert response.json() == {"status": "Online"}
+
+
+@pytest.mark.anyio
+async def test_create_db_skips_ddl_when_schema_revision_matches(engine, monkeypatch):
+    from sqlalchemy import Column, Integer, Table, text
+    from sqlmodel import SQLModel
+
+    from src.configs import db
+    from src.configs.configs import Settings
+
+    async with engine.begin() as conn:
+        await conn.execute(
+            text("CREATE TABLE IF NOT EXISTS alembic_version (version_num VARCHAR(32))")
+        )
+        await conn.execute(text("INSERT INTO alembic_version VALUES ('abc123')"))
+
+    calls = []
+    monkeypatch.setattr(db, "get_engine", lambda: engine)
+    monkeypatch.setattr(
+        SQLModel.metadata, "create_all", lambda *a, **kw: calls.append(a)
+    )
+    monkeypatch.setattr(
+        db,
+        "get_settings",
+        lambda: Settings(DATABASE_URI="test.db", API_KEY="k", SCHEMA_REVISION="abc123"),
+    )
+    await db.create_db_and_tables()
+    assert calls == []
+
+    monkeypatch.setattr(
+        db,
+        "get_settings",
+        lambda: Settings(DATABASE_URI="test.db", API_KEY="k", SCHEMA_REVISION="def456"),
+    )
+    await db.create_db_and_tables()
+    assert len(calls) == 1
+
+    # a table added since the revision was stamped is still created
+    monkeypatch.setattr(
+        db,
+        "get_settings",
+        lambda: Settings(DATABASE_URI="test.db", API_KEY="k", SCHEMA_REVISION="abc123"),
+    )
+    Table("not_created_yet", SQLModel.metadata, Column("id", Integer))
+    try:
+        await db.create_db_and_tables()
+    finally:
+        SQLModel.metadata.remove(SQLModel.metadata.tables["not_created_yet"])
+    assert len(calls) == 2
+
+    async with engine.begin() as conn:
+        await conn.execute(text("DROP TABLE alembic_version"))
+
+
+def test_lazy_logger_starts_listener_on_first_record():
+    import logging
+
+    from src.utils import loger
+
+    loger.stop_listener()
+    # keep pytest's capture handler on the root logger out of hasHandlers()
+    logging.getLogger("tests.lazy").propagate = False
+    logger = loger.LoggerSetup(logger_name="tests.lazy", lazy=True).logger
+    assert loger._listener is None
+
+    logger.info("written without the app lifespan")
+    assert loger._listener is not None
+    loger.stop_listener()
+    assert loger.log_queue.empty()
@@ -0,0 +1,308 @@
+import json
+import os
+import pathlib
+import socket
+import subprocess
+import sys
+import time
+
+import httpx
+import pytest
+from fastapi import Request
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from src.configs.configs import Settings
+from src.replication import services
+from src.replication.models import (
+    ChangesResponse,
+    ReplicatedBox,
+    ReplicatedChange,
+    ReplicationCursor,
+)
+from src.store import services as store_services
+from src.store.models import Storagebox
+
+ROOT = pathlib.Path(__file__).parent.parent
+API_KEY = "replication-test-key"
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_until(check, timeout: float = 20.0):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            result = check()
+            if result:
+                return result
+        except httpx.HTTPError:
+            pass
+        if time.monotonic() > deadline:
+            raise AssertionError("condition not met in time")
+        time.sleep(0.1)
+
+
+@pytest.fixture
+def cluster(tmp_path):
+    """
+    A primary and two followers, each a separate uvicorn process with its own
+    database and upload directory. Only the first follower receives pushes; the
+    second one relies on polling the primary's change log.
+    """
+    ports = {name: free_port() for name in ("primary", "pushed", "polling")}
+    urls = {name: f"http://127.0.0.1:{port}" for name, port in ports.items()}
+    roles = {
+        "primary": {
+            "REPLICATION_ROLE": "primary",
+            "REPLICATION_FOLLOWER_URLS": urls["pushed"],
+        },
+        "pushed": {
+            "REPLICATION_ROLE": "follower",
+            "REPLICATION_PRIMARY_URL": urls["primary"],
+            # long enough that the test observes the push, not the poll
+            "REPLICATION_POLL_SECONDS": "3600",
+        },
+        "polling": {
+            "REPLICATION_ROLE": "follower",
+            "REPLICATION_PRIMARY_URL": urls["primary"],
+            "REPLICATION_POLL_SECONDS": "0.2",
+        },
+    }
+
+    processes = []
+    for name, role in roles.items():
+        node_dir = tmp_path / name
+        node_dir.mkdir()
+        env = {
+            **os.environ,
+            "PYTHONPATH": str(ROOT),
+            "DATABASE_URI": str(node_dir / "storagebox.db"),
+            "API_KEY": API_KEY,
+            "UPLOAD_DIR": str(node_dir / "uploads"),
+            **role,
+        }
+        processes.append(
+            subprocess.Popen(
+                [sys.executable, "-m", "uvicorn", "src.main:app"]
+                + ["--port", str(ports[name]), "--log-level", "warning"],
+                cwd=node_dir,
+                env=env,
+                stdout=subprocess.DEVNULL,
+            )
+        )
+    try:
+        for url in urls.values():
+            wait_until(lambda url=url: httpx.get(url).status_code == 200)
+        yield urls, tmp_path
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait(timeout=10)
+
+
+def test_followers_forward_writes_and_serve_replicated_boxes(cluster):
+    urls, tmp_path = cluster
+    payload = b"replicated bytes\n" * 1000
+
+    # an upload sent to a follower is forwarded to the primary
+    response = httpx.post(
+        f"{urls['pushed']}/store/stream",
+        files=[("files", ("data.txt", payload, "text/plain"))],
+    )
+    assert response.status_code == 201
+    otp = response.json()["otp"]
+    assert len(list((tmp_path / "primary" / "uploads").iterdir())) == 1
+
+    for follower in ("pushed", "polling"):
+
+        def replicated(follower=follower):
+            r = httpx.post(f"{urls[follower]}/store/access", json={"otp": otp})
+            return r if r.status_code == 200 else None
+
+        access = wait_until(replicated)
+        [entry] = access.json()["files"]
+        assert entry["download_url"].startswith(urls[follower])
+        download = httpx.get(entry["download_url"])
+        assert download.status_code == 200
+        assert download.content == payload
+        assert "sha-256=" in download.headers["Repr-Digest"]
+
+    # followers keep the primary's ids, so the change log lines up everywhere
+    auth = {"X-API-Key": API_KEY}
+    changes = [
+        httpx.get(f"{url}/replication/changes", headers=auth).json()["changes"]
+        for url in urls.values()
+    ]
+    assert changes[0] == changes[1] == changes[2]
+    assert [change["box"]["otp"] for change in changes[0]] == [otp]
+
+
+def test_deletions_reach_followers(cluster):
+    urls, tmp_path = cluster
+    response = httpx.post(
+        f"{urls['primary']}/store/stream",
+        files=[("files", ("gone.txt", b"soon deleted", "text/plain"))],
+    )
+    otp = response.json()["otp"]
+
+    def access_status(follower: str) -> int:
+        return httpx.post(
+            f"{urls[follower]}/store/access", json={"otp": otp}
+        ).status_code
+
+    for follower in ("pushed", "polling"):
+        wait_until(lambda follower=follower: access_status(follower) == 200)
+
+    # an admin delete sent to a follower is forwarded and replicated back
+    response = httpx.delete(
+        f"{urls['pushed']}/admin/boxes/{otp}", headers={"X-API-Key": API_KEY}
+    )
+    assert response.status_code == 200
+    for follower in ("pushed", "polling"):
+        wait_until(lambda follower=follower: access_status(follower) == 404)
+        # only the poller's lock file is left
+        assert [
+            p.name for p in (tmp_path / follower / "uploads").iterdir() if p.is_file()
+        ] == [".replication.lock"]
+
+
+def test_replication_routes_require_api_key(cluster):
+    urls, _ = cluster
+    response = httpx.get(f"{urls['primary']}/replication/changes")
+    assert response.status_code == 401
+    response = httpx.post(
+        f"{urls['primary']}/replication/changes",
+        json=[],
+        headers={"X-API-Key": API_KEY},
+    )
+    assert response.status_code == 409
+
+
+@pytest.mark.anyio
+async def test_forward_to_unreachable_primary_returns_502():
+    settings = Settings(
+        DATABASE_URI="unused.db",
+        API_KEY=API_KEY,
+        REPLICATION_ROLE="follower",
+        REPLICATION_PRIMARY_URL=f"http://127.0.0.1:{free_port()}",
+    )
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    scope = {
+        "type": "http",
+        "method": "POST",
+        "path": "/store",
+        "query_string": b"",
+        "headers": [],
+    }
+    try:
+        response = await services.forward_to_primary(Request(scope, receive), settings)
+    finally:
+        await services.close_http_client()
+    assert response.status_code == 502
+    assert json.loads(response.body) == {"detail": "Primary node is unavailable."}
+
+
+@pytest.mark.anyio
+async def test_apply_changes_replaces_stale_box_with_reused_otp(
+    session, tmp_path, monkeypatch
+):
+    monkeypatch.setattr(store_services, "UPLOAD_DIR", tmp_path)
+    (tmp_path / "old.bin").write_bytes(b"previous owner")
+    session.add(
+        Storagebox(id=9001, otp="424242", file_details=[{"stored_filename": "old.bin"}])
+    )
+    await session.commit()
+    settings = Settings(DATABASE_URI="unused.db", API_KEY=API_KEY)
+
+    # the primary deleted 9001 and handed its otp to a new box
+    box = ReplicatedBox(id=9002, otp="424242", file_details=[])
+    created = ReplicatedChange(seq=9002, box_id=9002, otp="424242", box=box)
+    assert await services.apply_changes(session, [created], settings) == 1
+    record = await store_services.get_store_record_by_otp(session, "424242")
+    assert record.id == 9002
+    assert not (tmp_path / "old.bin").exists()
+
+    # once its deletion has been replayed, a late push can't bring it back
+    deleted = ReplicatedChange(seq=9003, box_id=9002, otp="424242", deleted=True)
+    assert await services.apply_changes(session, [deleted], settings) == 1
+    assert await services.apply_changes(session, [deleted, created], settings) == 0
+    assert await session.get(Storagebox, 9002) is None
+
+
+@pytest.mark.anyio
+async def test_apply_changes_follows_reused_box_id(session):
+    settings = Settings(DATABASE_URI="unused.db", API_KEY=API_KEY)
+    first = ReplicatedBox(id=9011, otp="111111", file_details=[])
+    second = ReplicatedBox(id=9011, otp="222222", file_details=[])
+    changes = [
+        ReplicatedChange(seq=9011, box_id=9011, otp="111111"),
+        ReplicatedChange(seq=9012, box_id=9011, otp="111111", deleted=True),
+        ReplicatedChange(seq=9013, box_id=9011, otp="222222", box=second),
+    ]
+    # the deleted box is gone from the primary, so its creation has no payload
+    assert await services.apply_changes(session, changes, settings) == 3
+    record = await session.get(Storagebox, 9011)
+    assert record.otp == "222222"
+
+    # a late push of the first box must not replace the second
+    late = ReplicatedChange(seq=9011, box_id=9011, otp="111111", box=first)
+    assert await services.apply_changes(session, [late], settings) == 0
+    await session.refresh(record)
+    assert record.otp == "222222"
+
+
+@pytest.mark.anyio
+async def test_follower_sync_resumes_from_stored_cursor(engine, monkeypatch):
+    primary_url = "http://primary.test"
+    change = ReplicatedChange(
+        seq=9021,
+        box_id=9021,
+        otp="333333",
+        box=ReplicatedBox(id=9021, otp="333333", file_details=[]),
+    )
+    requested = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        after_seq = int(request.url.params["after_seq"])
+        requested.append(after_seq)
+        changes = [change] if after_seq < change.seq else []
+        response = ChangesResponse(
+            changes=changes, last_seq=changes[-1].seq if changes else None
+        )
+        return httpx.Response(200, json=response.model_dump(mode="json"))
+
+    monkeypatch.setattr(
+        services,
+        "_http_client",
+        httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+    )
+    monkeypatch.setattr(
+        services,
+        "get_session_maker",
+        lambda: async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False),
+    )
+    settings = Settings(
+        DATABASE_URI="unused.db",
+        API_KEY=API_KEY,
+        REPLICATION_ROLE="follower",
+        REPLICATION_PRIMARY_URL=primary_url,
+    )
+    try:
+        assert await services.FollowerSync(settings).catch_up() == 1
+        # a restarted follower picks up after the last applied change
+        assert await services.FollowerSync(settings).catch_up() == 0
+    finally:
+        await services.close_http_client()
+    assert requested == [0, 9021, 9021]
+    async with AsyncSession(engine) as session:
+        cursor = await session.get(ReplicationCursor, primary_url)
+    assert cursor.last_seq == 9021
@@ -0,0 +1,360 @@
+import asyncio
+import base64
+import hashlib
+import io
+import os
+
+import google_crc32c
+import pytest
+from httpx import AsyncClient
+from PIL import Image
+from prometheus_client import REGISTRY
+from sqlmodel import delete
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from src.store import controllers, previews, scrubber, services, streaming
+from src.store.models import Storagebox, StoredFile
+
+
+@pytest.fixture(autouse=True)
+def upload_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(services, "UPLOAD_DIR", tmp_path)
+    monkeypatch.setattr(controllers, "UPLOAD_DIR", tmp_path)
+    return tmp_path
+
+
+def sha256_field(data: bytes) -> str:
+    return f"sha-256=:{base64.b64encode(hashlib.sha256(data).digest()).decode()}:"
+
+
+def crc32c_field(data: bytes) -> str:
+    digest = google_crc32c.Checksum(data).digest()
+    return f"crc32c=:{base64.b64encode(digest).decode()}:"
+
+
+@pytest.mark.anyio
+async def test_stream_upload_writes_files_directly(
+    client: AsyncClient, session, upload_dir
+):
+    payload = b"hello storagebox" * 1024
+    response = await client.post(
+        "/store/stream",
+        files=[
+            ("files", ("a.txt", payload, "text/plain")),
+            ("files", ("b.bin", b"\x00\x01", "application/octet-stream")),
+        ],
+        data={"note": "ignored"},
+    )
+    assert response.status_code == 201
+    otp = response.json()["otp"]
+
+    stored = sorted(upload_dir.iterdir(), key=lambda p: p.name.endswith("a.txt"))
+    assert len(stored) == 2
+    assert stored[1].read_bytes() == payload
+
+    record = await services.get_store_record_by_otp(session, otp)
+    details = {d["original_filename"]: d for d in record.file_details}
+    assert details["a.txt"]["file_size"] == len(payload)
+    assert details["a.txt"]["sha256"] == hashlib.sha256(payload).hexdigest()
+    assert details["a.txt"]["file_type"] == "text/plain"
+
+
+@pytest.mark.anyio
+async def test_stream_upload_rejects_oversized_file(
+    client: AsyncClient, upload_dir, monkeypatch
+):
+    monkeypatch.setattr(services, "MAX_FILE_SIZE_BYTES", 10)
+    response = await client.post(
+        "/store/stream", files=[("files", ("big.txt", b"x" * 11, "text/plain"))]
+    )
+    assert response.status_code == 413
+    assert list(upload_dir.iterdir()) == []
+
+
+@pytest.mark.anyio
+async def test_stream_upload_limits_part_count(
+    client: AsyncClient, upload_dir, monkeypatch
+):
+    monkeypatch.setattr(streaming, "MAX_FILES", 2)
+    monkeypatch.setattr(streaming, "MAX_FIELDS", 2)
+    response = await client.post(
+        "/store/stream",
+        files=[("files", (f"{i}.txt", b"x", "text/plain")) for i in range(3)],
+    )
+    assert response.status_code == 413
+    assert list(upload_dir.iterdir()) == []
+
+    response = await client.post(
+        "/store/stream",
+        files=[("files", ("a.txt", b"x", "text/plain"))],
+        data={"a": "1", "b": "2", "c": "3"},
+    )
+    assert response.status_code == 413
+
+
+@pytest.mark.anyio
+async def test_stream_upload_requires_multipart(client: AsyncClient):
+    response = await client.post("/store/stream", content=b"raw")
+    assert response.status_code == 415
+
+
+@pytest.mark.anyio
+async def test_access_returns_metadata_and_download_urls(
+    client: AsyncClient, upload_dir
+):
+    response = await client.post(
+        "/store/stream",
+        files=[
+            ("files", ("a.txt", b"aaa", "text/plain")),
+            ("files", ("b.png", b"bbbb", "application/octet-stream")),
+        ],
+    )
+    otp = response.json()["otp"]
+    # a file that vanished from disk is left out of the listing
+    missing = next(p for p in upload_dir.iterdir() if p.name.endswith("a.txt"))
+    missing.unlink()
+
+    response = await client.post("/store/access", json={"otp": otp})
+    assert response.status_code == 200
+    body = response.json()
+    assert body["otp"] == otp
+    [entry] = body["files"]
+    stored = next(upload_dir.iterdir()).name
+    assert entry == {
+        "original_filename": "b.png",
+        "file_type": "image/png",
+        "download_url": f"http://test/store/download/{stored}",
+        "file_size": 4,
+    }
+
+
+@pytest.mark.anyio
+async def test_upload_rejects_part_digest_mismatch(client: AsyncClient, upload_dir):
+    for route in ("/store", "/store/stream"):
+        response = await client.post(
+            route,
+            files=[
+                (
+                    "files",
+                    (
+                        "a.txt",
+                        b"actual",
+                        "text/plain",
+                        {"Repr-Digest": sha256_field(b"x")},
+                    ),
+                )
+            ],
+        )
+        assert response.status_code == 400
+    assert list(upload_dir.iterdir()) == []
+
+
+@pytest.mark.anyio
+async def test_upload_checks_crc32c_only_digest(client: AsyncClient, upload_dir):
+    for digest, expected_status in (
+        (crc32c_field(b"x"), 400),
+        (crc32c_field(b"ok"), 201),
+    ):
+        response = await client.post(
+            "/store/stream",
+            files=[("files", ("a.txt", b"ok", "text/plain", {"Repr-Digest": digest}))],
+        )
+        assert response.status_code == expected_status
+    assert [p.read_bytes() for p in upload_dir.iterdir()] == [b"ok"]
+
+
+@pytest.mark.anyio
+async def test_stream_upload_verifies_request_content_digest(client: AsyncClient):
+    request = client.build_request(
+        "POST", "/store/stream", files=[("files", ("a.txt", b"abc", "text/plain"))]
+    )
+    body = request.read()
+    headers = {"Content-Type": request.headers["Content-Type"]}
+
+    response = await client.post(
+        "/store/stream",
+        content=body,
+        headers={**headers, "Content-Digest": sha256_field(body + b"!")},
+    )
+    assert response.status_code == 400
+
+    response = await client.post(
+        "/store/stream",
+        content=body,
+        headers={**headers, "Content-Digest": sha256_field(body)},
+    )
+    assert response.status_code == 201
+
+
+@pytest.mark.anyio
+async def test_download_returns_repr_digest(client: AsyncClient, upload_dir):
+    payload = b"digest me"
+    response = await client.post(
+        "/store", files=[("files", ("a.txt", payload, "text/plain"))]
+    )
+    assert response.status_code == 201
+    stored = next(upload_dir.iterdir()).name
+
+    response = await client.get(f"/store/download/{stored}")
+    assert response.status_code == 200
+    assert response.content == payload
+    assert sha256_field(payload) in response.headers["Repr-Digest"]
+    assert 'filename="a.txt"' in response.headers["Content-Disposition"]
+
+
+@pytest.mark.anyio
+async def test_scrubber_reports_corrupted_files(
+    client: AsyncClient, engine, upload_dir, monkeypatch
+):
+    await client.post("/store", files=[("files", ("a.txt", b"original", "text/plain"))])
+    stored = next(upload_dir.iterdir())
+    stored.write_bytes(b"bit rot!")
+
+    monkeypatch.setattr(
+        scrubber, "get_session_maker", lambda: lambda: AsyncSession(engine)
+    )
+    sample = ("storagebox_scrub_files_total", {"result": "corrupt"})
+    before = REGISTRY.get_sample_value(*sample) or 0
+
+    await scrubber.IntegrityScrubber(
+        rate_bytes_per_sec=1024 * 1024, interval_seconds=0
+    ).run_pass()
+
+    assert REGISTRY.get_sample_value(*sample) == before + 1
+    assert REGISTRY.get_sample_value(
+        "storagebox_scrub_last_pass_completed_timestamp_seconds"
+    )
+
+
+@pytest.mark.anyio
+async def test_scrubber_runs_in_one_process_per_upload_dir(upload_dir, monkeypatch):
+    monkeypatch.setattr(scrubber, "SCRUB_LOCK_RETRY_SECONDS", 0.01)
+    first = scrubber.IntegrityScrubber(rate_bytes_per_sec=1, interval_seconds=0)
+    second = scrubber.IntegrityScrubber(rate_bytes_per_sec=1, interval_seconds=0)
+    lock_fd = await first.acquire_lock()
+
+    waiting = asyncio.create_task(second.acquire_lock())
+    await asyncio.sleep(0.05)
+    assert not waiting.done()
+
+    os.close(lock_fd)
+    os.close(await asyncio.wait_for(waiting, timeout=1))
+
+
+@pytest.mark.anyio
+async def test_text_preview_is_cached_with_headers(client: AsyncClient, upload_dir):
+    lines = b"".join(b"line %d\n" % i for i in range(2000))
+    await client.post("/store", files=[("files", ("log.txt", lines, "text/plain"))])
+    stored = next(p.name for p in upload_dir.iterdir() if p.is_file())
+
+    response = await client.get(f"/store/preview/{stored}")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "text/plain; charset=utf-8"
+    assert len(response.content) <= previews.TEXT_PREVIEW_BYTES
+    assert lines.startswith(response.content) and response.content.endswith(b"\n")
+    assert (upload_dir / ".previews" / f"{stored}.head.txt").exists()
+
+    response = await client.get(
+        f"/store/preview/{stored}",
+        headers={"If-None-Match": response.headers["ETag"]},
+    )
+    assert response.status_code == 304
+
+
+@pytest.mark.anyio
+async def test_image_preview_is_a_thumbnail(client: AsyncClient, upload_dir):
+    source = io.BytesIO()
+    Image.new("RGB", (1200, 600), "red").save(source, format="PNG")
+    await client.post(
+        "/store/stream", files=[("files", ("big.png", source.getvalue()))]
+    )
+    stored = next(p.name for p in upload_dir.iterdir() if p.is_file())
+
+    response = await client.get(f"/store/preview/{stored}")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/webp"
+    with Image.open(io.BytesIO(response.content)) as thumb:
+        assert thumb.size == (320, 160)
+
+
+@pytest.mark.anyio
+async def test_broken_image_preview_is_rejected_once(
+    client: AsyncClient, upload_dir, monkeypatch
+):
+    await client.post(
+        "/store", files=[("files", ("bad.png", b"not an image", "image/png"))]
+    )
+    stored = next(p.name for p in upload_dir.iterdir() if p.is_file())
+    generator = previews.PreviewGenerator()
+    monkeypatch.setattr(controllers, "get_preview_generator", lambda: generator)
+    calls = []
+    generate = generator._generate
+
+    async def counting_generate(*args):
+        calls.append(args)
+        await generate(*args)
+
+    monkeypatch.setattr(generator, "_generate", counting_generate)
+
+    for _ in range(2):
+        response = await client.get(f"/store/preview/{stored}")
+        assert response.status_code == 422
+    assert len(calls) == 1
+    assert list((upload_dir / ".previews").iterdir()) == []
+    generator.shutdown()
+
+
+@pytest.mark.anyio
+async def test_preview_unsupported_type(client: AsyncClient, upload_dir):
+    await client.post(
+        "/store", files=[("files", ("a.bin", b"\x00", "application/octet-stream"))]
+    )
+    stored = next(p.name for p in upload_dir.iterdir() if p.is_file())
+    response = await client.get(f"/store/preview/{stored}")
+    assert response.status_code == 415
+
+
+@pytest.mark.anyio
+async def test_preview_generation_is_single_flight_and_bounded(upload_dir, monkeypatch):
+    for name in ("a.txt", "b.txt"):
+        (upload_dir / name).write_bytes(b"x" * 100)
+    generator = previews.PreviewGenerator(max_cache_bytes=150)
+    calls = []
+    render = previews._render_text_head
+
+    def counting_render(*args):
+        calls.append(args[0])
+        render(*args)
+
+    monkeypatch.setattr(previews, "_render_text_head", counting_render)
+
+    results = await asyncio.gather(
+        *(generator.get("a.txt", "text/plain") for _ in range(5))
+    )
+    assert len(calls) == 1
+    assert {content for content, _ in results} == {b"x" * 100}
+
+    # another worker's generator, which never saw a.txt's preview being made
+    other = previews.PreviewGenerator(max_cache_bytes=150)
+    await other.get("b.txt", "text/plain")
+    # the cache only fits one preview, so the least recently used one is evicted
+    assert not (upload_dir / ".previews" / "a.txt.head.txt").exists()
+    assert (upload_dir / ".previews" / "b.txt.head.txt").exists()
+
+
+@pytest.mark.anyio
+async def test_stored_file_index_backfill_and_lookup(session, upload_dir):
+    session.add(
+        Storagebox(
+            id=7001, otp="700100", file_details=[{"stored_filename": "legacy.bin"}]
+        )
+    )
+    await session.commit()
+    # a database from before the index existed: boxes but no index rows
+    await session.exec(delete(StoredFile))
+    await session.commit()
+
+    assert await services.backfill_stored_file_index(session) >= 1
+    assert await services.backfill_stored_file_index(session) == 0
+    record = await services.get_store_record_by_stored_filename(session, "legacy.bin")
+    assert record.id == 7001